@@ -3,7 +3,7 @@
 __webnovelparser_completion() {
 
     if [ $COMP_CWORD == 1 ]; then
-        COMPREPLY=($(compgen -W "story shelf fetch" -- ${COMP_WORDS[COMP_CWORD]}))
+        COMPREPLY=($(compgen -W "story shelf fetch check watch" -- ${COMP_WORDS[COMP_CWORD]}))
         return
     fi
     
@@ -11,6 +11,8 @@ __webnovelparser_completion() {
         story) __webnovelparser_story_completion ;;
         shelf) __webnovelparser_shelf_completion ;;
         fetch) __webnovelparser_fetch_completion ;;
+        check) __webnovelparser_check_completion ;;
+        watch) __webnovelparser_watch_completion ;;
         *) COMPREPLY=() ;;
     esac
 
@@ -99,4 +101,23 @@ __webnovelparser_fetch_completion() {
 
     story_handles=`webnovelparser story list --name-only | xargs printf "%s "`
     COMPREPLY=($(compgen -W "$story_handles" -- ${COMP_WORDS[3]}))
-}
\ No newline at end of file
+}
+
+__webnovelparser_check_completion() {
+    local current=${COMP_WORDS[COMP_CWORD]}
+
+    if [[ $current == -* ]]; then
+        COMPREPLY=($(compgen -W "--workers --unread-only" -- $current))
+        return
+    fi
+
+    local shelf_handles
+
+    shelf_handles=`webnovelparser shelf list | xargs printf "%s "`
+    COMPREPLY=($(compgen -W "$shelf_handles" -- $current))
+}
+
+__webnovelparser_watch_completion() {
+    COMPREPLY=($(compgen -W "--interval --max-interval --jitter --parallel --engine --workers
+        --image-format --max-image-size --image-quality --text-only --epub3 --window" -- ${COMP_WORDS[COMP_CWORD]}))
+}
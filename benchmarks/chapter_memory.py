@@ -0,0 +1,40 @@
+"""Memory held by 100 in-flight chapters, as parsed trees vs. compact chapters.
+
+Run from the repository root: `python -m benchmarks.chapter_memory [paragraphs] [chapters]`.
+"""
+from gc import collect
+from sys import argv
+from tracemalloc import get_traced_memory, start, stop
+
+from benchmarks.parse_chapter import royalroad_like_page
+from webnovelparser.epub.parsing import CHAPTER_CONTENTS, parse_html
+from webnovelparser.epub.resources import NovelChapter
+
+
+def build(page: str, index: int) -> NovelChapter:
+    contents = parse_html(page, parse_only=CHAPTER_CONTENTS).find(class_='chapter-inner')
+    chapter = NovelChapter(index, f'https://example.invalid/chapter/{index}', f'Chapter {index + 1}', contents, None)
+    chapter.drop_images()
+    return chapter
+
+def measure(page: str, chapters: int, compact: bool):
+    collect()
+    start()
+    held = [ build(page, idx).compact() if compact else build(page, idx) for idx in range(chapters) ]
+    current, peak = get_traced_memory()
+    del held
+    stop()
+    return current, peak
+
+def main() -> None:
+    paragraphs = int(argv[1]) if len(argv) > 1 else 120
+    chapters = int(argv[2]) if len(argv) > 2 else 100
+    page = royalroad_like_page(paragraphs)
+
+    print(f'{chapters} chapters of {paragraphs} paragraphs ({len(page) / 1024:.0f} KiB pages)')
+    for name, compact in (('NovelChapter', False), ('CompactChapter', True)):
+        current, peak = measure(page, chapters, compact)
+        print(f'{name:<15} held {current / 2**20:7.1f} MiB  peak {peak / 2**20:7.1f} MiB')
+
+if __name__ == '__main__':
+    main()
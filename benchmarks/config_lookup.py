@@ -0,0 +1,50 @@
+"""Story and bookshelf lookups against a large library.
+
+Run from the repository root: `python -m benchmarks.config_lookup [stories]`.
+"""
+from os.path import join
+from sys import argv
+from tempfile import TemporaryDirectory
+from timeit import timeit
+
+from webnovelparser.cmdline.config import Config
+from webnovelparser.cmdline.config.entry import StoryEntry
+
+
+def populate(config: Config, stories: int) -> None:
+    for idx in range(stories):
+        config.add_story(StoryEntry(idx, f'handle-{idx}', f'Story Title {idx}', 0))
+
+    for shelf in range(stories // 1000 or 1):
+        config.create_bookshelf(f'shelf-{shelf}')
+        bookshelf = config.fetch_bookshelf(f'shelf-{shelf}')
+        for idx in range(shelf, stories, stories // 1000 or 1):
+            bookshelf.add_reference(config.fetch_story(id=idx))
+
+def main() -> None:
+    stories = int(argv[1]) if len(argv) > 1 else 20000
+    last = stories - 1
+
+    with TemporaryDirectory() as directory:
+        with Config(join(directory, 'config.json')) as config:
+            populate(config, stories)
+
+        with Config(join(directory, 'config.json')) as config:
+            shelf = config.fetch_bookshelf('shelf-0')
+            entry = config.fetch_story(id=last)
+            cases = (
+                ('fetch_story(id=...)', lambda: config.fetch_story(id=last)),
+                ('fetch_story(handle=...)', lambda: config.fetch_story(handle=f'HANDLE-{last}')),
+                ('fetch_story(title=...)', lambda: config.fetch_story(title=f'story title {last}')),
+                ('fetch_bookshelf(name)', lambda: config.fetch_bookshelf(f'shelf-{stories // 1000 - 1}')),
+                ('entry.coid in shelf', lambda: entry.coid in shelf),
+                ('add/remove_reference', lambda: (shelf.add_reference(entry), shelf.remove_reference(entry))),
+            )
+
+            print(f'{stories} stories')
+            for name, case in cases:
+                number = 1000
+                print(f'{name:<25} {timeit(case, number=number) / number * 1e6:9.2f} us')
+
+if __name__ == '__main__':
+    main()
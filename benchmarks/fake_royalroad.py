@@ -0,0 +1,252 @@
+"""A local stand-in for RoyalRoad that serves generated fiction.
+
+Run from the repository root: `python -m benchmarks.fake_royalroad [--port N] [fault options]`,
+or start one in-process with `FakeRoyalRoad(...)`. Point the command line at it
+with `--base-url http://127.0.0.1:PORT`.
+
+Every story id exists; /fiction/ID lists --chapters chapters, each with
+--paragraphs paragraphs and --images images. Faults (latency, 429s, 5xx,
+throttled bodies) are injected per request. GET /__stats returns what was
+served as JSON, POST /__reset clears it.
+"""
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from hashlib import sha256
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps
+from random import Random
+from struct import pack
+from threading import Lock, Thread
+from time import perf_counter, sleep
+from typing import Dict, List, Optional
+from zlib import compress, crc32
+
+
+@dataclass
+class FakeOptions:
+    chapters: int = 100
+    paragraphs: int = 60
+    images: int = 1
+    image_kib: int = 32
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    rate_429: float = 0.0
+    rate_5xx: float = 0.0
+    body_rate: float = 0.0 # bytes/s per response, 0 for unthrottled
+    seed: int = 0
+
+    @staticmethod
+    def add_arguments(parser: ArgumentParser) -> None:
+        for name, default in FakeOptions().__dict__.items():
+            parser.add_argument(f'--{name.replace("_", "-")}', type=type(default), default=default)
+
+    @staticmethod
+    def from_namespace(namespace) -> 'FakeOptions':
+        return FakeOptions(**{ name: getattr(namespace, name) for name in FakeOptions().__dict__ })
+
+
+class _Stats:
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.bytes = 0
+            self.statuses: Dict[int, int] = {}
+            self.chapter_latencies: List[float] = []
+
+    def record(self, status: int, size: int, chapter_latency: Optional[float]) -> None:
+        with self._lock:
+            self.requests += 1
+            self.bytes += size
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if chapter_latency is not None:
+                self.chapter_latencies.append(chapter_latency)
+
+    def to_json(self) -> str:
+        with self._lock:
+            return dumps({ 'requests': self.requests, 'bytes': self.bytes,
+                'statuses': self.statuses, 'chapter_latencies': self.chapter_latencies })
+
+
+def _png(width: int, height: int, seed: bytes) -> bytes:
+    # Noise, so the image neither compresses away nor needs Pillow to make.
+    row_bytes = width * 3
+    noise = bytearray()
+    block = seed
+    while len(noise) < row_bytes * height:
+        block = sha256(block).digest()
+        noise += block
+    raw = b''.join(b'\x00' + bytes(noise[y * row_bytes:(y + 1) * row_bytes]) for y in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return pack('>I', len(data)) + kind + data + pack('>I', crc32(kind + data))
+
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        + chunk(b'IDAT', compress(raw, 1)) + chunk(b'IEND', b''))
+
+
+class FakeRoyalRoad:
+
+    def __init__(self, options: FakeOptions, port: int=0) -> None:
+        self.options = options
+        self.stats = _Stats()
+        self._random = Random(options.seed)
+        self._random_lock = Lock()
+        self._images: Dict[str, bytes] = {}
+        self._images_lock = Lock()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                fake._handle(self)
+
+            def do_POST(self) -> None:
+                if self.path == '/__reset':
+                    fake.stats.reset()
+                fake._send(self, 200, b'', 'text/plain', record=False)
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'FakeRoyalRoad':
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exception_type, exception_val, tb):
+        self.stop()
+
+    def _roll(self) -> float:
+        with self._random_lock:
+            return self._random.random()
+
+    def _handle(self, request: BaseHTTPRequestHandler) -> None:
+        started = perf_counter()
+        path = request.path.split('?')[0]
+
+        if path == '/__stats':
+            return self._send(request, 200, self.stats.to_json().encode(), 'application/json', record=False)
+
+        options = self.options
+        if options.latency or options.latency_jitter:
+            sleep(options.latency + self._roll() * options.latency_jitter)
+
+        if self._roll() < options.rate_429:
+            return self._send(request, 429, b'', 'text/plain', headers={ 'Retry-After': '0' })
+        if self._roll() < options.rate_5xx:
+            return self._send(request, 503, b'', 'text/plain')
+
+        parts = path.strip('/').split('/')
+        if len(parts) == 2 and parts[0] == 'fiction':
+            return self._send(request, 200, self._story_page(parts[1]).encode(), 'text/html; charset=utf-8')
+        if len(parts) == 4 and parts[0] == 'fiction' and parts[2] == 'chapter':
+            return self._send(request, 200, self._chapter_page(parts[1], int(parts[3])).encode(),
+                'text/html; charset=utf-8', chapter_started=started)
+        if len(parts) == 2 and parts[0] in ('covers', 'images'):
+            return self._send(request, 200, self._image(path), 'image/png')
+
+        self._send(request, 404, b'not found', 'text/plain')
+
+    def _send(self, request: BaseHTTPRequestHandler, status: int, body: bytes, content_type: str,
+        headers: Optional[Dict[str, str]]=None, record: bool=True, chapter_started: Optional[float]=None) -> None:
+
+        request.send_response(status)
+        request.send_header('Content-Type', content_type)
+        request.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+
+        rate = self.options.body_rate if record else 0
+        if rate > 0:
+            # Trickled out in ~20 ms slices to model a slow or congested link.
+            step = max(int(rate / 50), 1)
+            for offset in range(0, len(body), step):
+                request.wfile.write(body[offset:offset + step])
+                request.wfile.flush()
+                sleep(step / rate)
+        else:
+            request.wfile.write(body)
+
+        if record:
+            self.stats.record(status, len(body),
+                perf_counter() - chapter_started if chapter_started is not None else None)
+
+    def _story_page(self, story_id: str) -> str:
+        rows = ''.join(f'<tr><td><a href="/fiction/{story_id}/chapter/{idx}">Chapter {idx + 1}: '
+            + f'The {idx + 1}th Trial</a></td><td>2 days ago</td></tr>' for idx in range(self.options.chapters))
+
+        return f'''<!DOCTYPE html><html><head><title>Story {story_id}</title>
+<script>window.ads = [];</script></head><body><nav class="navbar">{'<a href="#">link</a>' * 40}</nav>
+<div class="fic-header"><div class="cover-col"><img src="{self.base_url}/covers/{story_id}.png" /></div>
+<div class="fic-title"><h1>Generated Story {story_id}</h1><h4>by Bench Author</h4></div></div>
+<div class="description">{'<p>Blurb text for the story.</p>' * 10}</div>
+<table id="chapters"><thead><tr><th>Chapter</th><th>Released</th></tr></thead><tbody>{rows}</tbody></table>
+<div class="comments">{'<div class="comment">A comment.</div>' * 30}</div></body></html>'''
+
+    def _chapter_page(self, story_id: str, index: int) -> str:
+        paragraphs = ''.join(f'<p style="text-align: justify">Paragraph {para} of chapter {index + 1}, '
+            + 'with <em>some</em> <strong>inline</strong> markup &amp; entities to chew on. '
+            + 'Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod.</p>'
+            for para in range(self.options.paragraphs))
+        images = ''.join(f'<p><img src="{self.base_url}/images/{story_id}-{index}-{image}.png" /></p>'
+            for image in range(self.options.images))
+
+        return f'''<!DOCTYPE html><html><head><title>Chapter {index + 1}</title>
+<script>window.ads = [];</script></head><body><nav class="navbar">{'<a href="#">link</a>' * 40}</nav>
+<h1>Chapter {index + 1}: The {index + 1}th Trial</h1>
+<div class="chapter-inner chapter-content">{paragraphs}{images}</div>
+<div class="comments">{'<div class="comment">A comment.</div>' * 30}</div></body></html>'''
+
+    def _image(self, path: str) -> bytes:
+        with self._images_lock:
+            if (image := self._images.get(path)) is None:
+                # Square, 3 bytes a pixel, sized to roughly image_kib.
+                side = max(int((self.options.image_kib * 1024 / 3) ** 0.5), 1)
+                image = self._images[path] = _png(side, side, path.encode())
+            return image
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument('--port', type=int, default=8765)
+    FakeOptions.add_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeRoyalRoad(FakeOptions.from_namespace(args), port=args.port)
+    print(f'Serving on {server.base_url}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+if __name__ == '__main__':
+    main()
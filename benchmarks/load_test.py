@@ -0,0 +1,191 @@
+"""End-to-end build throughput against the local fake RoyalRoad server.
+
+Run from the repository root: `python -m benchmarks.load_test [options]`, e.g.
+`python -m benchmarks.load_test --sizes 50,200 --latency 0.05 --rate-429 0.02`.
+
+For every book size a fake server is started in its own process. EpubBuilder
+is then driven directly, once per engine, followed by the `fetch one` and
+`fetch all --batch` commands. Each scenario runs in a fresh process, so peak
+RSS is its own. Chapter latency is client-side (retries and rate limiting
+included) for EpubBuilder runs, and server-side for command runs (marked *).
+"""
+from argparse import ArgumentParser
+from json import dumps, loads
+from os import environ, makedirs, wait4
+from os.path import abspath, dirname, join
+from statistics import quantiles
+from subprocess import PIPE, Popen
+from sys import executable
+from tempfile import TemporaryDirectory, TemporaryFile
+from time import perf_counter
+from typing import Dict, List, NamedTuple, Tuple
+from urllib.request import Request, urlopen
+
+from benchmarks.fake_royalroad import FakeOptions
+
+_REPOSITORY = dirname(dirname(abspath(__file__)))
+
+CLI = 'import sys; from webnovelparser.cmdline import run; sys.argv[0] = "webnovelparser"; sys.exit(run())'
+
+
+class Result(NamedTuple):
+    scenario: str
+    chapters: int
+    seconds: float
+    bytes: int
+    latencies: List[float]
+    server_side: bool
+    peak_rss_kib: int
+
+    def row(self) -> List[str]:
+        p50, p99 = (quantiles(self.latencies, n=100)[i] * 1000 for i in (49, 98)) \
+            if len(self.latencies) > 1 else (0.0, 0.0)
+        mark = '*' if self.server_side else ''
+        return [ self.scenario, str(self.chapters), f'{self.seconds:.2f}',
+            f'{self.chapters / self.seconds:.1f}', f'{self.bytes / self.seconds / 2**20:.2f}',
+            f'{p50:.0f}{mark}', f'{p99:.0f}{mark}', f'{self.peak_rss_kib / 1024:.0f}' ]
+
+
+def run_builder(args) -> None:
+    # Child process: one EpubBuilder run, reported as a JSON line on stdout.
+    from webnovelparser.epub.builder import EpubBuilder, EpubBuilderArguments
+    from webnovelparser.epub.imaging import ImageProcessingOptions
+    from webnovelparser.epub.session import WebSession
+    from webnovelparser.epub.webnovel import RoyalRoadWebNovel, set_base_url
+
+    set_base_url(args.base_url)
+    latencies = []
+
+    class TimedNovel(RoyalRoadWebNovel):
+        def fetch_chapter_page(self, index: int):
+            started = perf_counter()
+            try:
+                return super().fetch_chapter_page(index)
+            finally:
+                latencies.append(perf_counter() - started)
+
+    started = perf_counter()
+    novel = TimedNovel(1, session=WebSession(pool_size=args.workers, rate=args.rate,
+        connections=2 * args.workers))
+    builder = EpubBuilder(EpubBuilderArguments(0, novel.metadata.num_chapters - 1, args.output,
+        workers=args.workers, engine=args.engine,
+        image_options=ImageProcessingOptions(text_only=args.text_only)), novel)
+    builder.run()
+
+    print(dumps({ 'seconds': perf_counter() - started, 'chapters': builder.written, 'latencies': latencies }))
+
+
+class _FakeServer:
+
+    def __init__(self, args, chapters: int) -> None:
+        options = { **FakeOptions.from_namespace(args).__dict__, 'chapters': chapters }
+        command = [ executable, '-m', 'benchmarks.fake_royalroad', '--port', '0' ]
+        for name, value in options.items():
+            command += [ f'--{name.replace("_", "-")}', str(value) ]
+
+        self._process = Popen(command, stdout=PIPE, text=True)
+        self.base_url = self._process.stdout.readline().split()[-1]
+
+    def reset(self) -> None:
+        urlopen(Request(f'{self.base_url}/__reset', data=b'', method='POST')).read()
+
+    def stats(self) -> Dict:
+        return loads(urlopen(f'{self.base_url}/__stats').read())
+
+    def stop(self) -> None:
+        self._process.terminate()
+        self._process.wait()
+
+
+def _measure(command: List[str], home: str, cwd: str) -> Tuple[str, int, float]:
+    # os.wait4 gives this child's own peak RSS, unlike RUSAGE_CHILDREN.
+    with TemporaryFile('w+') as output:
+        started = perf_counter()
+        process = Popen(command, stdout=output, stderr=output, stdin=PIPE, text=True,
+            cwd=cwd, env={ **environ, 'HOME': home, 'PYTHONPATH': _REPOSITORY })
+        process.stdin.close()
+        _, status, rusage = wait4(process.pid, 0)
+        seconds = perf_counter() - started
+        process.returncode = status # Already reaped; keeps Popen from waiting again.
+
+        output.seek(0)
+        text = output.read()
+        if status != 0:
+            raise RuntimeError(f'{" ".join(command)} failed:\n{text}')
+        return text, rusage.ru_maxrss, seconds
+
+def _run_scenarios(args, server: _FakeServer, chapters: int, workdir: str) -> List[Result]:
+    results = []
+    base = [ '--base-url', server.base_url, '--no-cache', '--rate', str(args.rate) ]
+    images = [ '--text-only' ] if args.text_only else []
+
+    for engine in args.engines.split(','):
+        server.reset()
+        output, peak, _ = _measure([ executable, '-m', 'benchmarks.load_test', '--child-builder',
+            '--base-url', server.base_url, '--engine', engine, '--workers', str(args.workers),
+            '--rate', str(args.rate), '--output', join(workdir, f'builder-{engine}.epub'),
+            *images ], workdir, workdir)
+        report = loads(output.strip().splitlines()[-1])
+        results.append(Result(f'EpubBuilder {engine}', report['chapters'], report['seconds'],
+            server.stats()['bytes'], report['latencies'], False, peak))
+
+    home = join(workdir, f'home-{chapters}')
+    makedirs(join(home, '.config'), exist_ok=True)
+
+    server.reset()
+    _, peak, seconds = _measure([ executable, '-c', CLI, *base, 'fetch', 'one', '1', '-t', 'Bench',
+        '-o', join(workdir, 'fetch-one.epub'), '-w', str(args.workers), *images ], home, workdir)
+    stats = server.stats()
+    results.append(Result('fetch one', chapters, seconds, stats['bytes'], stats['chapter_latencies'], True, peak))
+
+    for story_id in range(2, 2 + args.stories):
+        _measure([ executable, '-c', CLI, *base, 'story', 'add', str(story_id) ], home, workdir)
+
+    server.reset()
+    _, peak, seconds = _measure([ executable, '-c', CLI, *base, 'fetch', 'all', '--batch',
+        '--parallel', str(args.stories), '-w', str(args.workers), *images ], home, workdir)
+    stats = server.stats()
+    results.append(Result(f'fetch all --batch x{args.stories}', chapters * args.stories, seconds,
+        stats['bytes'], stats['chapter_latencies'], True, peak))
+
+    return results
+
+def _print_table(rows: List[List[str]]) -> None:
+    widths = [ max(len(row[column]) for row in rows) for column in range(len(rows[0])) ]
+    for row in rows:
+        print('  '.join(cell.rjust(width) if column else cell.ljust(width)
+            for column, (cell, width) in enumerate(zip(row, widths))))
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument('--sizes', default='50,200')
+    parser.add_argument('--engines', default='threads,asyncio')
+    parser.add_argument('--workers', type=int, default=10)
+    parser.add_argument('--rate', type=float, default=500.0)
+    parser.add_argument('--stories', type=int, default=3)
+    parser.add_argument('--text-only', action='store_true')
+    FakeOptions.add_arguments(parser)
+
+    parser.add_argument('--child-builder', action='store_true')
+    parser.add_argument('--base-url')
+    parser.add_argument('--engine', default='threads')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    if args.child_builder:
+        return run_builder(args)
+
+    rows = [ [ 'scenario', 'chapters', 'seconds', 'chapters/s', 'MiB/s', 'p50 ms', 'p99 ms', 'peak RSS MiB' ] ]
+    with TemporaryDirectory() as workdir:
+        for chapters in (int(size) for size in args.sizes.split(',')):
+            server = _FakeServer(args, chapters)
+            try:
+                rows += [ result.row() for result in _run_scenarios(args, server, chapters, workdir) ]
+            finally:
+                server.stop()
+
+    _print_table(rows)
+    print('* server-side latency')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Per-chapter parse time: whole page with html.parser vs. targeted parsing.
+
+Run from the repository root: `python -m benchmarks.parse_chapter [paragraphs] [number]`.
+"""
+from sys import argv
+from timeit import repeat
+
+from bs4 import BeautifulSoup
+
+from webnovelparser.epub.parsing import CHAPTER_CONTENTS, DEFAULT_HTML_PARSER
+
+
+def royalroad_like_page(paragraphs: int) -> str:
+    # Roughly the shape of a RoyalRoad chapter page: a large header and
+    # navigation, scripts, the chapter itself, then a long comment section.
+    nav = ''.join(f'<li class="nav-item"><a href="/link/{i}" class="nav-link">Link {i}</a></li>' for i in range(150))
+    scripts = ''.join(f'<script type="text/javascript">window.ad{i} = {{ slot: "{i}", sizes: [[300, 250]] }};</script>'
+        for i in range(40))
+    chapter = ''.join(f'<p class="cnXyz{i % 7}" style="text-align: justify">Paragraph {i}, with <em>some</em> '
+        f'<strong>inline</strong> markup &amp; entities &mdash; and a bit more text to make it a paragraph.</p>'
+        for i in range(paragraphs))
+    comments = ''.join(f'<div class="comment" id="comment-{i}"><div class="media-left"><img src="/avatar/{i}.png"/></div>'
+        f'<div class="media-body"><h4 class="media-heading"><a href="/profile/{i}">User {i}</a></h4>'
+        f'<div class="comment-body"><p>Thanks for the chapter! {i}</p></div></div></div>' for i in range(300))
+
+    return (f'<!DOCTYPE html><html><head><title>Chapter</title>{scripts}</head><body>'
+        f'<header><nav><ul>{nav}</ul></nav></header><div class="page-content"><div class="portlet">'
+        f'<div class="chapter-inner chapter-content">{chapter}</div></div>'
+        f'<div class="comments-container">{comments}</div></div><footer>{nav}</footer></body></html>')
+
+def main() -> None:
+    paragraphs = int(argv[1]) if len(argv) > 1 else 120
+    number = int(argv[2]) if len(argv) > 2 else 20
+    page = royalroad_like_page(paragraphs)
+
+    cases = {
+        'html.parser, whole page': lambda: BeautifulSoup(page, 'html.parser').find(class_='chapter-inner'),
+        'html.parser, targeted': lambda: BeautifulSoup(page, 'html.parser', parse_only=CHAPTER_CONTENTS).find(class_='chapter-inner'),
+    }
+    if DEFAULT_HTML_PARSER == 'lxml':
+        cases['lxml, whole page'] = lambda: BeautifulSoup(page, 'lxml').find(class_='chapter-inner')
+        cases['lxml, targeted'] = lambda: BeautifulSoup(page, 'lxml', parse_only=CHAPTER_CONTENTS).find(class_='chapter-inner')
+
+    print(f'{len(page) / 1024:.0f} KiB page, {paragraphs} paragraphs, best of 5 x {number}')
+    baseline = None
+    for name, case in cases.items():
+        best = min(repeat(case, number=number, repeat=5)) / number
+        baseline = baseline or best
+        print(f'{name:<26} {best * 1000:8.2f} ms/chapter  {baseline / best:5.1f}x')
+
+if __name__ == '__main__':
+    main()
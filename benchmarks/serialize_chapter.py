@@ -0,0 +1,48 @@
+"""Per-chapter serialization: template soup + prettify() vs. NovelChapter.write_to().
+
+Run from the repository root: `python -m benchmarks.serialize_chapter [paragraphs] [number]`.
+"""
+from io import BytesIO
+from sys import argv
+from timeit import repeat
+
+from benchmarks.parse_chapter import royalroad_like_page
+from webnovelparser.epub.parsing import CHAPTER_CONTENTS, parse_html
+from webnovelparser.epub.resources import NovelChapter
+from webnovelparser.epub.templates import XMLTemplates
+
+
+def main() -> None:
+    paragraphs = int(argv[1]) if len(argv) > 1 else 2000
+    number = int(argv[2]) if len(argv) > 2 else 5
+
+    contents = parse_html(royalroad_like_page(paragraphs), parse_only=CHAPTER_CONTENTS).find(class_='chapter-inner')
+    chapter = NovelChapter(0, 'https://example.invalid/chapter/0', 'Chapter 1', contents, None)
+
+    def prettified() -> bytes:
+        # What every chapter used to go through: the parsed template with the
+        # title and body added, then prettify().
+        document = XMLTemplates.get_xhtml('chapter')
+        title = document.new_tag('title')
+        title.string = chapter.title
+        document.find('head').append(title)
+        heading = document.new_tag('h1')
+        heading.string = chapter.title
+        document.find('body').append(heading)
+        document.find('body').append(contents)
+        output = document.prettify().encode('utf-8')
+        contents.extract()
+        return output
+
+    def streamed() -> bytes:
+        fobj = BytesIO()
+        chapter.write_to(fobj)
+        return fobj.getvalue()
+
+    print(f'{paragraphs} paragraphs, best of 5 x {number}')
+    for name, case in (('prettify()', prettified), ('write_to()', streamed)):
+        best = min(repeat(case, number=number, repeat=5)) / number
+        print(f'{name:<12} {best * 1000:8.2f} ms/chapter  {len(case()) / 1024:8.1f} KiB')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Import cost of config-only commands, checked against a startup budget.
+
+Run from the repository root: `python -m benchmarks.startup [budget_ms]`.
+Exits non-zero when a command loads the network or parsing stack, or when
+its cumulative import time exceeds the budget.
+"""
+from os import environ, makedirs
+from os.path import join
+from subprocess import run
+from sys import argv, executable, exit
+from tempfile import TemporaryDirectory
+from typing import Dict, List, Tuple
+
+COMMANDS = (
+    ('shelf', 'list'),
+    ('story', 'list', '--name-only'),
+    ('--help',),
+)
+
+HEAVY_MODULES = ('requests', 'bs4', 'lxml', 'tenacity', 'urllib3', 'pkg_resources', 'PIL')
+
+def import_times(args: Tuple[str, ...], home: str) -> Dict[str, int]:
+    # -X importtime reports "self | cumulative | name" in microseconds.
+    result = run([executable, '-X', 'importtime', '-c',
+        'import sys; from webnovelparser.cmdline import run; sys.argv[0] = "webnovelparser"; sys.exit(run())',
+        *args], env={**environ, 'HOME': home}, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'{" ".join(args)} failed:\n{result.stdout}{result.stderr}')
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+def main() -> None:
+    budget_ms = float(argv[1]) if len(argv) > 1 else 100.0
+    failures: List[str] = []
+
+    with TemporaryDirectory() as home:
+        makedirs(join(home, '.config'))
+        for args in COMMANDS:
+            times = import_times(args, home)
+            total_ms = times.get('webnovelparser.cmdline', 0) / 1000
+            heavy = sorted({ name.split('.')[0] for name in times if name.split('.')[0] in HEAVY_MODULES })
+
+            print(f'{" ".join(args):<25} {total_ms:7.1f} ms  heavy imports: {", ".join(heavy) or "none"}')
+            if heavy:
+                failures.append(f'{" ".join(args)} imported {", ".join(heavy)}')
+            if total_ms > budget_ms:
+                failures.append(f'{" ".join(args)} took {total_ms:.1f} ms, budget is {budget_ms:.1f} ms')
+
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -10,7 +10,10 @@ if __name__ == '__main__':
         description='',
 
         python_requires='>=3.8',
-        install_requires=['requests', 'bs4', 'setuptools', 'tenacity'],
+        install_requires=['requests', 'bs4', 'lxml', 'tenacity'],
+        extras_require={
+            'images': ['Pillow']
+        },
 
         entry_points= {
             'console_scripts': ['webnovelparser=webnovelparser.cmdline:run']
@@ -0,0 +1,115 @@
+from zipfile import ZipFile
+
+import pytest
+
+from webnovelparser.epub.builder import EpubBuilder, EpubBuilderArguments
+from webnovelparser.epub.parsing import parse_html
+from webnovelparser.epub.resources import NovelChapter, NovelMetadata
+from webnovelparser.epub.session import spool_response
+
+
+class _Response:
+
+    def __init__(self, url, text='', status_code=200, content=b'', content_type='text/html'):
+        self.url = url
+        self.text = text
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers = { 'content-type': content_type }
+        self._content = content
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise RuntimeError(f'{self.status_code} for url: {self.url}')
+
+    def iter_content(self, chunk_size):
+        yield self._content
+
+
+class _Session:
+
+    def download(self, url):
+        if 'missing' in url:
+            return _Response(url, status_code=404), None
+        response = _Response(url, content=url.encode(), content_type='image/png')
+        return response, spool_response(response)
+
+
+class _Novel:
+
+    # Every chapter mixes a lazy-loaded image (no src), a broken one and a good one.
+    BODY = ('<div class="chapter-inner"><p>Text {idx}</p><img data-src="https://example.com/lazy.png"/>'
+        + '<img src="https://example.com/missing.png"/><img src="https://example.com/{idx}.png"/></div>')
+
+    def __init__(self, chapters):
+        self.story_id = 1
+        self.session = _Session()
+        self.metadata = NovelMetadata('https://example.com/fiction/1', 'Story', 'Author', chapters)
+
+    def peek_chapter_title(self, idx):
+        return f'Chapter {idx + 1}'
+
+    def peek_chapter_href(self, idx):
+        return f'/fiction/1/chapter/{idx}'
+
+    def get_cover_image(self):
+        return None
+
+    def get_chapter(self, idx):
+        return self.parse_chapter_page(idx, self.fetch_chapter_page(idx))
+
+    def fetch_chapter_page(self, idx):
+        return _Response(f'https://example.com/chapter/{idx}', text=_Novel.BODY.format(idx=idx))
+
+    def parse_chapter_page(self, idx, response):
+        contents = parse_html(response.text).find(class_='chapter-inner')
+        return NovelChapter(idx, response.url, self.peek_chapter_title(idx), contents, self.session)
+
+
+@pytest.mark.parametrize('engine', EpubBuilderArguments.ENGINES)
+def test_chapters_survive_images_without_src(tmp_path, engine):
+    filename = str(tmp_path / 'book.epub')
+    builder = EpubBuilder(EpubBuilderArguments(0, 2, filename, workers=2, engine=engine), _Novel(3))
+
+    assert builder.run() == 3
+    assert builder.failed == 0
+
+    with ZipFile(filename) as archive:
+        chapters = sorted(name for name in archive.namelist() if name.startswith('OEBPS/Text/'))
+        assert len(chapters) == 3
+        for name in chapters:
+            xhtml = archive.read(name)
+            assert xhtml.count(b'<img') == 1
+            assert b'lazy.png' not in xhtml and b'missing.png' not in xhtml
+
+
+def test_asyncio_writes_off_the_event_loop(tmp_path, monkeypatch):
+    from threading import current_thread
+
+    from webnovelparser.epub.writer import EpubFile
+
+    writer_threads = set()
+    add_chapter = EpubFile.add_chapter
+
+    def recording_add_chapter(self, chapter):
+        writer_threads.add(current_thread())
+        return add_chapter(self, chapter)
+
+    monkeypatch.setattr(EpubFile, 'add_chapter', recording_add_chapter)
+    store_path = str(tmp_path / 'store.sqlite')
+
+    # The second build reads every chapter back from the store, on the writer thread too.
+    for name in ('first.epub', 'second.epub'):
+        filename = str(tmp_path / name)
+        builder = EpubBuilder(EpubBuilderArguments(0, 2, filename, workers=2, engine='asyncio',
+            store_path=store_path), _Novel(3))
+
+        assert builder.run() == 3
+        assert builder.failed == 0
+
+    assert len(writer_threads) == 2
+    assert current_thread() not in writer_threads
+
+    with ZipFile(str(tmp_path / 'first.epub')) as first, ZipFile(str(tmp_path / 'second.epub')) as second:
+        names = sorted(name for name in first.namelist() if name.startswith('OEBPS/Text/'))
+        assert [ first.read(name) for name in names ] == [ second.read(name) for name in names ]
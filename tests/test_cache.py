@@ -0,0 +1,40 @@
+from requests.structures import CaseInsensitiveDict
+
+from webnovelparser.epub.cache import HttpCache, StoryPageCache, validators_for
+
+
+class _Response:
+
+    def __init__(self, url, content=b'', headers=None, status_code=200):
+        self.url = url
+        self.content = content
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.encoding = 'utf-8'
+
+
+def test_stored_entry_revalidates_with_the_response_validators(tmp_path):
+    page_headers = { 'ETag': '"abc"', 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT', 'Content-Type': 'text/html' }
+    url = 'https://example.com/fiction/1'
+    sent = []
+
+    def getter(url, headers=None):
+        sent.append(headers)
+        return _Response(url, status_code=304) if headers else _Response(url, b'page', page_headers)
+
+    cache = HttpCache(str(tmp_path))
+    cache.fetch(url, getter)
+    response = cache.fetch(url, getter)
+
+    assert sent[1] == validators_for(_Response(url, headers=page_headers))
+    assert sent[1] == { 'If-None-Match': '"abc"', 'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT' }
+    assert response.content == b'page'
+
+
+def test_story_cache_round_trip(tmp_path):
+    cache = StoryPageCache(str(tmp_path / 'stories'), ttl=60)
+    cache.store(1, { 'title': 'Story' })
+
+    record = cache.load(1)
+    assert record['title'] == 'Story'
+    assert cache.is_fresh(record)
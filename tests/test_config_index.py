@@ -0,0 +1,66 @@
+from webnovelparser.cmdline.config.entry import StoryEntry
+from webnovelparser.cmdline.config.index import StoryIndex
+
+
+def _index(*stories):
+    index = StoryIndex()
+    for story in stories:
+        index.add_story(story)
+    return index
+
+
+def test_update_keeps_position():
+    first, second, third = StoryEntry(1, 'a', 'A', 0), StoryEntry(2, 'b', 'B', 0), StoryEntry(3, 'c', 'C', 0)
+    index = _index(first, second, third)
+
+    index.add_story(first.with_value(last_read=10))
+
+    assert [ story.id for story in index.stories ] == [ 1, 2, 3 ]
+    assert [ story['id'] for story in index.toJSON()['stories'] ] == [ 1, 2, 3 ]
+    assert index.fetch_by_id(1).last_read == 10
+
+
+def test_duplicate_lookups_are_stable_across_updates():
+    first, second = StoryEntry(1, 'dup', 'Same', 0), StoryEntry(2, 'dup', 'Same', 0)
+    index = _index(first, second)
+
+    index.add_story(first.with_value(last_read=5))
+
+    assert index.fetch_by_handle('dup').id == 1
+    assert index.fetch_by_title('same').id == 1
+
+    index.add_story(second.with_value(last_read=7))
+
+    assert index.fetch_by_handle('dup').id == 1
+
+
+def test_update_that_changes_keys_reindexes():
+    first, second = StoryEntry(1, 'dup', 'One', 0), StoryEntry(2, 'dup', 'Two', 0)
+    index = _index(first, second)
+
+    index.add_story(first.with_value(handle='renamed'))
+    assert index.fetch_by_handle('dup').id == 2
+    assert index.fetch_by_handle('renamed').id == 1
+
+    # Taking the shared handle back puts it ahead of the later story again.
+    index.add_story(index.fetch_by_id(1).with_value(handle='dup'))
+    assert index.fetch_by_handle('dup').id == 1
+    assert index.fetch_by_handle('renamed') is None
+    assert len(index) == 2
+
+
+def test_saved_order_survives_last_read_update(tmp_path):
+    from webnovelparser.cmdline.config import Config
+
+    path = str(tmp_path / 'config.json')
+    with Config(path) as config:
+        config.add_story(StoryEntry(1, 'dup', 'One', 0))
+        config.add_story(StoryEntry(2, 'dup', 'Two', 0))
+
+    with Config(path) as config:
+        config.add_story(config.fetch_story(id=1).with_value(last_read=3))
+
+    with Config(path) as config:
+        assert [ story.id for story in config.stories() ] == [ 1, 2 ]
+        assert config.fetch_story(handle='dup').id == 1
+        assert config.fetch_story(id=1).last_read == 3
@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+from os import listdir
+
+import pytest
+
+from webnovelparser.epub.files import atomic_write
+
+
+def test_atomic_write_creates_parents_and_replaces(tmp_path):
+    path = tmp_path / 'nested' / 'entry.json'
+
+    with atomic_write(str(path), 'w') as fobj:
+        fobj.write('first')
+    with atomic_write(str(path), 'w') as fobj:
+        fobj.write('second')
+
+    assert path.read_text() == 'second'
+    assert listdir(str(path.parent)) == [ 'entry.json' ]
+
+
+def test_failed_write_keeps_the_old_file(tmp_path):
+    path = tmp_path / 'entry.body'
+    path.write_bytes(b'old')
+
+    with pytest.raises(RuntimeError):
+        with atomic_write(str(path)) as fobj:
+            fobj.write(b'partial')
+            raise RuntimeError('interrupted')
+
+    assert path.read_bytes() == b'old'
+    assert listdir(str(tmp_path)) == [ 'entry.body' ]
+
+
+def test_concurrent_writers_never_share_a_temporary_file(tmp_path):
+    path = str(tmp_path / 'entry.body')
+
+    def write(value):
+        with atomic_write(path) as fobj:
+            for _ in range(100):
+                fobj.write(value)
+
+    values = [ bytes([ value ]) * 1024 for value in range(16) ]
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(write, values))
+
+    content = open(path, 'rb').read()
+    assert content in [ value * 100 for value in values ]
+    assert listdir(str(tmp_path)) == [ 'entry.body' ]
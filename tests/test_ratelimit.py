@@ -0,0 +1,52 @@
+from time import monotonic
+
+from webnovelparser.epub.ratelimit import HostRateLimiter
+
+
+class _Response:
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+URL = 'https://example.com/fiction/1'
+
+
+def _answer(limiter, response):
+    with limiter.acquire(URL) as permit:
+        permit.response = response
+
+
+def test_bare_503_halves_concurrency_without_pausing_the_host():
+    limiter = HostRateLimiter(rate=1000, max_concurrency=8)
+
+    _answer(limiter, _Response(503))
+
+    assert limiter.concurrency(URL) == 4
+    assert limiter.throttled == 1
+
+    started = monotonic()
+    _answer(limiter, _Response(200))
+    assert monotonic() - started < 0.5
+
+
+def test_503_with_retry_after_pauses_the_host():
+    limiter = HostRateLimiter(rate=1000, max_concurrency=8)
+
+    _answer(limiter, _Response(503, { 'Retry-After': '1' }))
+
+    started = monotonic()
+    _answer(limiter, _Response(200))
+    assert monotonic() - started >= 0.9
+
+
+def test_bare_429_still_pauses_the_host(monkeypatch):
+    monkeypatch.setattr(HostRateLimiter, '_HostRateLimiter__DEFAULT_BACKOFF', 0.3)
+    limiter = HostRateLimiter(rate=1000, max_concurrency=8)
+
+    _answer(limiter, _Response(429))
+
+    started = monotonic()
+    _answer(limiter, _Response(200))
+    assert monotonic() - started >= 0.25
@@ -0,0 +1,112 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from webnovelparser.epub.parsing import parse_html
+from webnovelparser.epub.resources import NovelChapter, NovelImage
+
+
+class _Registry:
+
+    text_only = False
+
+    def __init__(self, failing=()):
+        self._failing = set(failing)
+        self.requested = []
+
+    def fetch(self, src, session):
+        self.requested.append(src)
+        if src in self._failing:
+            raise RuntimeError(f'cannot fetch {src}')
+        name = src.rsplit('/', 1)[-1]
+        return NovelImage(f'image-{name}', f'Images/{name}.png', 'image/png', b'png')
+
+
+def _chapter(body):
+    contents = parse_html(f'<div class="chapter-inner">{body}</div>').find(class_='chapter-inner')
+    return NovelChapter(0, 'https://example.com/chapter/0', 'Chapter 1', contents, session=None)
+
+
+def test_image_sources_skips_tags_without_src():
+    chapter = _chapter('<p><img data-src="https://example.com/lazy.png"/></p>'
+        + '<p><img src="https://example.com/a.png"/></p><p><img src=""/></p>')
+
+    assert chapter.image_sources() == [ 'https://example.com/a.png' ]
+
+
+def test_attach_images_drops_tags_without_src():
+    chapter = _chapter('<p>before</p><img data-src="https://example.com/lazy.png"/>'
+        + '<img src="https://example.com/a.png"/><p>after</p>')
+
+    image = NovelImage('image-a', 'Images/a.png', 'image/png', b'png')
+    images = chapter.attach_images({ 'https://example.com/a.png': image })
+
+    assert images == [ image ]
+    assert [ tag['src'] for tag in chapter.contents.find_all('img') ] == [ '../Images/a.png' ]
+    assert 'before' in chapter.contents.text and 'after' in chapter.contents.text
+
+
+def test_fetch_images_keeps_chapter_with_bad_images():
+    for executor in (None, ThreadPoolExecutor(2)):
+        chapter = _chapter('<img data-src="https://example.com/lazy.png"/>'
+            + '<img src="https://example.com/broken.png"/><img src="https://example.com/a.png"/>')
+        registry = _Registry(failing=[ 'https://example.com/broken.png' ])
+
+        images = chapter.fetch_images(registry, executor)
+
+        assert [ image.id for image in images ] == [ 'image-a.png' ]
+        assert sorted(registry.requested) == [ 'https://example.com/a.png', 'https://example.com/broken.png' ]
+        assert [ tag['src'] for tag in chapter.contents.find_all('img') ] == [ '../Images/a.png.png' ]
+        assert chapter.compact().xhtml.count(b'<img') == 1
+
+        if executor is not None:
+            executor.shutdown()
+
+
+def test_duplicate_download_releases_its_spool():
+    from threading import Barrier, Lock, local
+    import webnovelparser.epub.resources as resources
+    from webnovelparser.epub.session import spool_response
+
+    class GatedLock:
+        # Holds each thread before its third acquisition (the registration),
+        # so both downloads are past the first digest check before either
+        # registers.
+        def __init__(self):
+            self._lock = Lock()
+            self._barrier = Barrier(2, timeout=5)
+            self._acquisitions = local()
+
+        def __enter__(self):
+            count = self._acquisitions.count = getattr(self._acquisitions, 'count', 0) + 1
+            if count == 3:
+                self._barrier.wait()
+            self._lock.acquire()
+
+        def __exit__(self, *exc_info):
+            self._lock.release()
+
+    spools = []
+
+    class Response:
+        headers = { 'content-type': 'image/png' }
+        def raise_for_status(self):
+            pass
+        def iter_content(self, chunk_size):
+            yield b'same bytes'
+
+    class Session:
+        def download(self, url):
+            content, digest = spool_response(Response())
+            spools.append(content)
+            return Response(), (content, digest)
+
+    registry = resources.ImageRegistry()
+    registry._lock = GatedLock()
+
+    with ThreadPoolExecutor(2) as executor:
+        first, second = executor.map(lambda src: registry.fetch(src, Session()),
+            [ 'https://example.com/a.png', 'https://example.com/b.png' ])
+
+    assert first is second
+    assert registry.unique_images == 1
+    assert len(spools) == 2
+    assert sum(spool.closed for spool in spools) == 1
@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import sleep
+
+from webnovelparser.epub.session import WebSession
+
+
+class _StreamedResponse:
+
+    status_code = 200
+    ok = True
+    headers = { 'content-type': 'image/png' }
+
+    def __init__(self, tracker):
+        self._tracker = tracker
+
+    def iter_content(self, chunk_size):
+        with self._tracker.reading():
+            for _ in range(5):
+                sleep(0.01)
+                yield b'chunk'
+
+    def close(self):
+        pass
+
+
+class _Tracker:
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reading_now = 0
+        self.most_at_once = 0
+
+    def reading(self):
+        tracker = self
+
+        class Reading:
+            def __enter__(self):
+                with tracker._lock:
+                    tracker.reading_now += 1
+                    tracker.most_at_once = max(tracker.most_at_once, tracker.reading_now)
+
+            def __exit__(self, *exc_info):
+                with tracker._lock:
+                    tracker.reading_now -= 1
+
+        return Reading()
+
+
+class _FakeRequestsSession:
+
+    def __init__(self, tracker):
+        self._tracker = tracker
+
+    def get(self, url, **kwargs):
+        assert kwargs['stream'] is True
+        return _StreamedResponse(self._tracker)
+
+
+def test_download_reads_body_inside_the_limiter_permit():
+    tracker = _Tracker()
+    session = WebSession(pool_size=1, rate=1000)
+    session._session = _FakeRequestsSession(tracker)
+
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(lambda idx: session.download(f'https://example.com/{idx}.png'), range(4)))
+
+    assert tracker.most_at_once == 1
+    for response, (content, digest) in results:
+        assert content.read() == b'chunk' * 5
+        assert len(digest) == 64
+
+
+def test_connection_pool_covers_every_thread():
+    session = WebSession(pool_size=4, connections=8)
+    assert session._adapter._pool_maxsize == 8
+    assert WebSession(pool_size=4)._adapter._pool_maxsize == 4
@@ -0,0 +1,47 @@
+import pytest
+
+from webnovelparser.epub.session import spool_response
+from webnovelparser.epub.webnovel import _RoyalRoadStoryPage
+
+
+class _Response:
+
+    status_code = 200
+    ok = True
+
+    def __init__(self, content_type):
+        self.headers = {} if content_type is None else { 'content-type': content_type }
+
+    def iter_content(self, chunk_size):
+        yield b'\xff\xd8\xff cover bytes'
+
+
+class _Session:
+
+    def __init__(self, content_type):
+        self._content_type = content_type
+
+    def download(self, url):
+        response = _Response(self._content_type)
+        return response, spool_response(response)
+
+
+def _cover(content_type):
+    page = _RoyalRoadStoryPage('https://example.com/fiction/1', 'Story', 'Author', [],
+        'https://example.com/covers/1')
+    return page.fetch_cover_image(_Session(content_type))
+
+
+@pytest.mark.parametrize('content_type', [ 'application/octet-stream', 'binary/octet-stream', '', None ])
+def test_cover_without_an_image_type_falls_back_to_jpeg(content_type):
+    cover = _cover(content_type)
+
+    assert cover.content_type == 'image/jpeg'
+    assert cover.path == 'Images/Cover.jpeg'
+
+
+def test_cover_keeps_its_image_type():
+    cover = _cover('image/png; charset=binary')
+
+    assert cover.content_type == 'image/png'
+    assert cover.path == 'Images/Cover.png'
@@ -0,0 +1,37 @@
+from time import gmtime, strftime
+from zipfile import ZipFile
+
+import webnovelparser.epub.writer as writer
+from webnovelparser.epub.resources import NovelMetadata
+from webnovelparser.epub.writer import EpubFile
+
+
+def _modified(filename):
+    with ZipFile(filename) as archive:
+        opf = archive.read('OEBPS/content.opf').decode('utf-8')
+    return opf.split('<meta property="dcterms:modified">')[1].split('</meta>')[0]
+
+
+def _build(filename):
+    with EpubFile(NovelMetadata('https://example.com/fiction/1', 'Story', 'Author', 0), filename, epub3=True):
+        pass
+
+
+def test_epub3_modified_is_utc(tmp_path, monkeypatch):
+    # A local clock twelve hours ahead of UTC must not leak into the stamp.
+    now = 1_700_000_000
+    monkeypatch.delenv('SOURCE_DATE_EPOCH', raising=False)
+    monkeypatch.setattr(writer, 'time', lambda: now)
+    monkeypatch.setattr(writer, 'localtime', lambda *args: gmtime(now + 12 * 60 * 60))
+
+    _build(str(tmp_path / 'book.epub'))
+
+    assert _modified(str(tmp_path / 'book.epub')) == strftime('%Y-%m-%dT%H:%M:%SZ', gmtime(now))
+
+
+def test_epub3_modified_honours_source_date_epoch(tmp_path, monkeypatch):
+    monkeypatch.setenv('SOURCE_DATE_EPOCH', '1600000000')
+
+    _build(str(tmp_path / 'book.epub'))
+
+    assert _modified(str(tmp_path / 'book.epub')) == '2020-09-13T12:26:40Z'
@@ -1,22 +1,46 @@
 
 from argparse import ArgumentParser
+from json import dumps
 from os.path import expanduser
 import traceback
 
+from webnovelparser.cmdline.check import command_parser as check_command_parser
 from webnovelparser.cmdline.config import Config
+from webnovelparser.cmdline.config.sqlite import SqliteConfig
 from webnovelparser.cmdline.fetch import command_parser as fetch_command_parser
 from webnovelparser.cmdline.story import command_parser as story_command_parser
 from webnovelparser.cmdline.shelf import command_parser as shelf_command_parser
+from webnovelparser.cmdline.watch import command_parser as watch_command_parser
+from webnovelparser.epub.defaults import DEFAULT_RATE, DEFAULT_STORY_TTL, DEFAULT_TIMEOUT, HTML_PARSERS
 
-_CONFIG_FILE_LOCATION = expanduser('~/.config/webnovelparser.json')
+_CONFIG_FILE_LOCATION = expanduser('~/.config/webnovelparser.sqlite')
+_LEGACY_CONFIG_FILE_LOCATION = expanduser('~/.config/webnovelparser.json')
+_CACHE_DIRECTORY = expanduser('~/.cache/webnovelparser')
 
 def run():
     try:
-        with Config(_CONFIG_FILE_LOCATION) as config:
+        with SqliteConfig(_CONFIG_FILE_LOCATION, migrate_from=_LEGACY_CONFIG_FILE_LOCATION) as config:
             arg_parser = __arg_parser_factory(config)
             args = arg_parser.parse_args()
 
-            args.run(args)
+            if args.HTML_PARSER is not None:
+                from webnovelparser.epub.parsing import set_html_parser
+                set_html_parser(args.HTML_PARSER)
+
+            if args.BASE_URL is not None:
+                from webnovelparser.epub.webnovel import set_base_url
+                set_base_url(args.BASE_URL)
+
+            if args.PROFILE is not None:
+                from webnovelparser.epub.profiling import enable_profiling
+                enable_profiling()
+
+            try:
+                args.run(args)
+            finally:
+                # Written even for an interrupted run; that's often the slow one.
+                if args.PROFILE is not None:
+                    __write_profile(args.PROFILE)
     except KeyboardInterrupt:
         print()
         return -1
@@ -27,9 +51,36 @@ def run():
     else:
         return 0
 
+def __write_profile(path: str) -> None:
+    from webnovelparser.epub.profiling import get_profiler
+
+    report = dumps(get_profiler().report(), indent=2)
+    if path == '-':
+        print(report)
+        return
+
+    with open(path, 'w') as fobj:
+        fobj.write(report)
+    print(f'Wrote profile to {path}.')
+
 def __arg_parser_factory(config: Config) -> ArgumentParser:
     parser = ArgumentParser()
     parser.set_defaults(run=lambda args: parser.print_help())
+    parser.add_argument('--cache-dir', type=str, dest='CACHE_DIR',
+        default=_CACHE_DIRECTORY)
+    parser.add_argument('--no-cache', dest='CACHE_DIR',
+        action='store_const', const=None)
+    parser.add_argument('--timeout', type=float, dest='TIMEOUT',
+        default=DEFAULT_TIMEOUT)
+    parser.add_argument('--rate', type=float, dest='RATE',
+        default=DEFAULT_RATE)
+    parser.add_argument('--story-ttl', type=float, dest='STORY_TTL',
+        default=DEFAULT_STORY_TTL)
+    parser.add_argument('--refresh', dest='REFRESH', action='store_true')
+    parser.add_argument('--html-parser', type=str, dest='HTML_PARSER',
+        choices=HTML_PARSERS)
+    parser.add_argument('--base-url', type=str, dest='BASE_URL')
+    parser.add_argument('--profile', type=str, dest='PROFILE', metavar='FILE')
     subparser_factory = parser.add_subparsers()
 
     story_action, story_parser = story_command_parser(config, lambda: subparser_factory.add_parser('story'))
@@ -41,5 +92,11 @@ def __arg_parser_factory(config: Config) -> ArgumentParser:
     fetch_action, fetch_parser = fetch_command_parser(config, lambda: subparser_factory.add_parser('fetch'))
     fetch_parser.set_defaults(run=fetch_action)
 
+    check_action, check_parser = check_command_parser(config, lambda: subparser_factory.add_parser('check'))
+    check_parser.set_defaults(run=check_action)
+
+    watch_action, watch_parser = watch_command_parser(config, lambda: subparser_factory.add_parser('watch'))
+    watch_parser.set_defaults(run=watch_action)
+
     return parser
     
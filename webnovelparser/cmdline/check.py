@@ -0,0 +1,90 @@
+
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from json import JSONDecodeError, dump, load
+from os.path import join
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+from webnovelparser.cmdline.config import Config
+from webnovelparser.cmdline.config.entry import StoryEntry
+from webnovelparser.cmdline.util import web_session_factory
+from webnovelparser.epub.defaults import DEFAULT_POOL_SIZE
+from webnovelparser.epub.files import atomic_write
+
+if TYPE_CHECKING: # Imported where used; see util.py.
+    from webnovelparser.epub.webnovel import ChapterList
+
+
+def command_parser(config: Config, parser_factory: Callable[[], ArgumentParser]):
+
+    def action(args_namespace):
+        from webnovelparser.epub.webnovel import RoyalRoadWebNovel
+
+        if args_namespace.SHELF_NAME is not None and config.fetch_bookshelf(args_namespace.SHELF_NAME) is None:
+            print(f"Bookshelf '{args_namespace.SHELF_NAME}' doesn't exist!")
+            return
+
+        stories = config.stories(args_namespace.SHELF_NAME)
+        stories.sort(key=lambda story: story.handle)
+
+        cache_path = __cache_path(args_namespace)
+        known = __load_chapter_lists(cache_path)
+        session = web_session_factory(args_namespace)
+
+        def check(story: StoryEntry) -> 'ChapterList':
+            return RoyalRoadWebNovel.fetch_chapter_list(story.id, session, known.get(str(story.id)))
+
+        with ThreadPoolExecutor(args_namespace.WORKERS) as executor:
+            futures = [ (story, executor.submit(check, story)) for story in stories ]
+
+            # Printed in handle order, each as soon as it and those before it are in.
+            checked = {}
+            for story, future in futures:
+                try:
+                    chapter_list = checked[str(story.id)] = future.result()
+                except Exception as e:
+                    print(f'{story.handle}: check failed, exception was: {e}')
+                    continue
+
+                unread = max(chapter_list.num_chapters - story.last_read, 0)
+                if unread:
+                    latest, _ = chapter_list.chapters[-1]
+                    print(f'{story.handle}: {unread} unread of {chapter_list.num_chapters}, latest "{latest}"')
+                elif not args_namespace.UNREAD_ONLY:
+                    print(f'{story.handle}: up to date ({chapter_list.num_chapters} chapters)')
+
+        if any(known.get(story_id) is not chapter_list for story_id, chapter_list in checked.items()):
+            __store_chapter_lists(cache_path, { **known, **checked })
+
+    parser = parser_factory()
+    parser.add_argument('-w', '--workers', type=int, dest='WORKERS',
+        default=DEFAULT_POOL_SIZE)
+    parser.add_argument('--unread-only', dest='UNREAD_ONLY', action='store_true')
+    parser.add_argument('SHELF_NAME', type=str, nargs='?')
+
+    return action, parser
+
+def __cache_path(args_namespace) -> Optional[str]:
+    if (cache_dir := getattr(args_namespace, 'CACHE_DIR', None)) is None:
+        return None
+    return join(cache_dir, 'chapter_lists.json')
+
+def __load_chapter_lists(path: Optional[str]) -> Dict[str, 'ChapterList']:
+    from webnovelparser.epub.webnovel import ChapterList
+
+    if path is None:
+        return {}
+
+    try:
+        with open(path, 'r') as fobj:
+            return { story_id: ChapterList(validators, [ tuple(chapter) for chapter in chapters ])
+                for story_id, (validators, chapters) in load(fobj).items() }
+    except (OSError, JSONDecodeError, TypeError, ValueError):
+        return {}
+
+def __store_chapter_lists(path: Optional[str], chapter_lists: Dict[str, 'ChapterList']) -> None:
+    if path is None:
+        return
+
+    with atomic_write(path, 'w') as fobj:
+        dump(chapter_lists, fobj)
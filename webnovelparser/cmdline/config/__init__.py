@@ -1,7 +1,7 @@
 
 from io import StringIO
 from json import JSONDecodeError, load, dump
-from typing import List, Type
+from typing import Dict, List, Type
 
 from webnovelparser.cmdline.config.bookshelf import Bookshelf, BookshelfConfigIdentifer
 from webnovelparser.cmdline.config.entry import StoryEntry
@@ -23,15 +23,18 @@ class Config:
         except (JSONDecodeError, ValueError):
             self._repr = Config.__build_new_config_repr()
 
+        self._shelves: Dict[str, Bookshelf] = {}
+        for bookshelf in self._repr['bookshelves']:
+            self._shelves.setdefault(bookshelf.name, bookshelf)
+
     def stories(self, shelf_name: str=None) -> List[StoryEntry]:
         if shelf_name is None:
             return self._repr['index'].stories
 
         stories = []
-        
-        for bookshelf in self._repr['bookshelves']:
-            if bookshelf.name == shelf_name:
-                break
+
+        if (bookshelf := self.fetch_bookshelf(shelf_name)) is None:
+            return stories
 
         for ref in bookshelf.get_references():
             if story := self._repr['index'].fetch_story(ref):
@@ -75,45 +78,45 @@ class Config:
 
         if kwargs not in ({}, None):
             raise ValueError(f'StoryEntry does not have the following identifiable fields: {kwargs.keys()}')
-        
-        def story_matches(story_entry: StoryEntry):
-            matches = False
 
-            if isinstance(id, int):
-                matches = (id == story_entry.id)
+        # The most specific identifier given wins: title, then handle, then id.
+        index: StoryIndex = self._repr['index']
 
-            if isinstance(handle, str):
-                matches = (handle.casefold() == story_entry.handle.casefold())
-            
-            if isinstance(title, str):
-                matches = (title.casefold() == story_entry.title.casefold())
+        if isinstance(title, str):
+            return index.fetch_by_title(title)
 
-            return matches
-        
-        return next(filter(story_matches, self._repr['index'].stories), None)
+        if isinstance(handle, str):
+            return index.fetch_by_handle(handle)
+
+        if isinstance(id, int):
+            return index.fetch_by_id(id)
+
+        return None
 
     def create_bookshelf(self, name: str):
         
         if self.fetch_bookshelf(name) is None:    
-            self._repr['bookshelves'].append(Bookshelf(name, []))
+            self._shelves[name] = Bookshelf(name, [])
+            self._repr['bookshelves'].append(self._shelves[name])
             return True
 
         return False
     
     def delete_bookshelf(self, name: str):
         
-        if shelf := self.fetch_bookshelf(name):
+        if shelf := self._shelves.pop(name, None):
             self._repr['bookshelves'].remove(shelf)
             return True
         
         return False
     
     def fetch_bookshelf(self, name: str) -> Bookshelf:
-        try:
-            return next(filter(lambda bs: bs.name == name, self._repr['bookshelves']))
-        except StopIteration:
-            return None
+        return self._shelves.get(name, None)
+
 
+    def close(self) -> None:
+        # Releases the file without writing anything back.
+        self._file.close()
 
     def __enter__(self):
         self._file.__enter__()
@@ -1,5 +1,5 @@
 
-from typing import List
+from typing import Dict, List
 
 from webnovelparser.cmdline.config.objects import ConfigObject, ConfigObjectIdentifier
 from webnovelparser.cmdline.config.entry import StoryEntry, StoryEntryConfigIdentifier
@@ -15,17 +15,17 @@ class Bookshelf(ConfigObject):
         return self._name
 
     def get_references(self) -> List[ConfigObjectIdentifier]:
-        return self._story_coids[:]
+        return list(self._story_coids)
 
     def add_reference(self, entry: StoryEntry):
         if not entry.coid in self._story_coids:
-            self._story_coids.append(entry.coid)
+            self._story_coids[entry.coid] = None
             return True
         return False
     
     def remove_reference(self, entry: StoryEntry):
         if entry.coid in self._story_coids:
-            self._story_coids.remove(entry.coid)
+            del self._story_coids[entry.coid]
             return True
         return False
 
@@ -42,7 +42,8 @@ class Bookshelf(ConfigObject):
     def __init__(self, name: str, story_coids: List[ConfigObjectIdentifier], coid: ConfigObjectIdentifier=None) -> None:
         self._coid = coid or BookshelfConfigIdentifer()
         self._name = name
-        self._story_coids = story_coids
+        # A dict rather than a set, so references keep their insertion order.
+        self._story_coids: Dict[ConfigObjectIdentifier, None] = dict.fromkeys(story_coids)
 
 class BookshelfConfigIdentifer(ConfigObjectIdentifier):
 
@@ -1,5 +1,5 @@
 
-from typing import Dict, List
+from typing import Dict, Hashable, List, Optional
 from webnovelparser.cmdline import config
 
 from webnovelparser.cmdline.config.entry import StoryEntry, StoryEntryConfigIdentifier
@@ -18,16 +18,34 @@ class StoryIndex(ConfigObject):
 
     def fetch_story(self, coid: ConfigObjectIdentifier) -> StoryEntry:
         return self._stories.get(coid, None)
+
+    def fetch_by_id(self, id: int) -> Optional[StoryEntry]:
+        return self.__first(self._by_id, id)
+
+    def fetch_by_handle(self, handle: str) -> Optional[StoryEntry]:
+        return self.__first(self._by_handle, handle.casefold())
+
+    def fetch_by_title(self, title: str) -> Optional[StoryEntry]:
+        return self.__first(self._by_title, title.casefold())
     
     def add_story(self, story: StoryEntry):
+        # An update keeps the entry's place, both in the saved order and among
+        # stories sharing a handle or title.
+        if (current := self._stories.get(story.coid, None)) is None:
+            self._stories[story.coid] = story
+            self.__index(story)
+            return
+
+        self.__unindex(current)
         self._stories[story.coid] = story
+        self.__reindex(story)
     
     def remove_story(self, entry: StoryEntry):
         if entry is None:
             return
             
         if entry.coid in self._stories:
-            del self._stories[entry.coid]
+            self.__unindex(self._stories.pop(entry.coid))
     
     def toJSON(self) -> Dict:
         return {
@@ -35,15 +53,58 @@ class StoryIndex(ConfigObject):
             "stories": [ story.toJSON() for story in self._stories.values() ]
         }
     
+    def __first(self, index: Dict[Hashable, Dict[ConfigObjectIdentifier, None]], key: Hashable) -> Optional[StoryEntry]:
+        coids = index.get(key, None)
+        return self._stories[next(iter(coids))] if coids else None
+
+    def __index(self, story: StoryEntry):
+        # Handles and titles aren't guaranteed unique, so each key maps to an
+        # insertion-ordered set of coids; lookups return the oldest entry.
+        for index, key in self.__keys(story):
+            index.setdefault(key, {})[story.coid] = None
+
+    def __reindex(self, story: StoryEntry):
+        # Lookups return the oldest entry for a key, so a story going back into
+        # an index is placed by its position in _stories, not appended.
+        for index, key in self.__keys(story):
+            coids = index.setdefault(key, {})
+            coids[story.coid] = None
+            if len(coids) > 1:
+                ordered = [ coid for coid in self._stories if coid in coids ]
+                coids.clear()
+                coids.update(dict.fromkeys(ordered))
+
+    def __unindex(self, story: StoryEntry):
+        for index, key in self.__keys(story):
+            coids = index.get(key, {})
+            coids.pop(story.coid, None)
+            if not coids:
+                index.pop(key, None)
+
+    def __keys(self, story: StoryEntry):
+        yield self._by_id, story.id
+        if isinstance(story.handle, str):
+            yield self._by_handle, story.handle.casefold()
+        if isinstance(story.title, str):
+            yield self._by_title, story.title.casefold()
+
     def __contains__(self, obj) -> bool:
         if not isinstance(obj, StoryEntry):
             return False
         return obj.coid in self._stories
 
+    def __len__(self) -> int:
+        return len(self._stories)
     
     def __init__(self, coid: ConfigObjectIdentifier=None, stories: Dict[ConfigObjectIdentifier, StoryEntry]=None) -> None:
         self._coid = coid or StoryIndexConfigIdentifier()
         self._stories = stories or {}
+        self._by_id = {}
+        self._by_handle = {}
+        self._by_title = {}
+
+        for story in self._stories.values():
+            self.__index(story)
 
 
 class StoryIndexConfigIdentifier(ConfigObjectIdentifier):
@@ -0,0 +1,239 @@
+from contextlib import contextmanager
+from os import makedirs
+from os.path import dirname, exists
+from sqlite3 import Connection, connect
+from typing import Iterator, List, Optional, Tuple
+
+from webnovelparser.cmdline.config import Config
+from webnovelparser.cmdline.config.bookshelf import Bookshelf, BookshelfConfigIdentifer
+from webnovelparser.cmdline.config.entry import StoryEntry, StoryEntryConfigIdentifier
+from webnovelparser.cmdline.config.objects import ConfigObjectIdentifier
+
+
+class SqliteBookshelf(Bookshelf):
+
+    # References live in the database; every change is its own transaction.
+    def get_references(self) -> List[ConfigObjectIdentifier]:
+        return [ StoryEntryConfigIdentifier(coid) for coid, in self._db.execute(
+            'SELECT story FROM shelf_stories WHERE shelf = ? ORDER BY rowid', (str(self.coid),)) ]
+
+    def add_reference(self, entry: StoryEntry):
+        with _transaction(self._db):
+            return self._db.execute('INSERT OR IGNORE INTO shelf_stories (shelf, story) VALUES (?, ?)',
+                (str(self.coid), str(entry.coid))).rowcount == 1
+
+    def remove_reference(self, entry: StoryEntry):
+        with _transaction(self._db):
+            return self._db.execute('DELETE FROM shelf_stories WHERE shelf = ? AND story = ?',
+                (str(self.coid), str(entry.coid))).rowcount == 1
+
+    def toJSON(self) -> dict:
+        return {
+            **super().toJSON(),
+            "story_coids": [ str(coid) for coid in self.get_references() ]
+        }
+
+    def __contains__(self, obj) -> bool:
+        return self._db.execute('SELECT 1 FROM shelf_stories WHERE shelf = ? AND story = ?',
+            (str(self.coid), str(obj))).fetchone() is not None
+
+    def __init__(self, db: Connection, name: str, coid: ConfigObjectIdentifier) -> None:
+        super().__init__(name, [], coid=coid)
+        self._db = db
+
+
+class SqliteConfig(Config):
+
+    # Same API as the JSON-backed Config, but stories, shelves and shelf
+    # membership are rows: lookups go through indexes, each update touches
+    # only its own rows, and concurrent processes serialize on SQLite's lock
+    # instead of overwriting each other's copy of the whole file.
+
+    __SCHEMA_VERSION = 1
+
+    __SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS stories (
+            coid TEXT PRIMARY KEY,
+            id INTEGER,
+            handle TEXT,
+            title TEXT,
+            last_read INTEGER,
+            handle_key TEXT,
+            title_key TEXT
+        );
+        CREATE INDEX IF NOT EXISTS stories_id ON stories (id);
+        CREATE INDEX IF NOT EXISTS stories_handle ON stories (handle_key);
+        CREATE INDEX IF NOT EXISTS stories_title ON stories (title_key);
+        CREATE TABLE IF NOT EXISTS shelves (
+            coid TEXT PRIMARY KEY,
+            name TEXT UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS shelf_stories (
+            shelf TEXT NOT NULL,
+            story TEXT NOT NULL,
+            UNIQUE (shelf, story)
+        );
+        CREATE INDEX IF NOT EXISTS shelf_stories_story ON shelf_stories (story);
+    '''
+
+    __STORY_COLUMNS = 'coid, id, handle, title, last_read'
+
+    def __init__(self, filepath: str, migrate_from: Optional[str]=None):
+        if directory := dirname(filepath):
+            makedirs(directory, exist_ok=True)
+
+        # Autocommit; writes open their own short transactions.
+        self._db = connect(filepath, timeout=30, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode = WAL')
+
+        if self._db.execute('PRAGMA user_version').fetchone()[0] != SqliteConfig.__SCHEMA_VERSION:
+            with _transaction(self._db):
+                # Re-checked under the write lock, another process may have won.
+                if self._db.execute('PRAGMA user_version').fetchone()[0] != SqliteConfig.__SCHEMA_VERSION:
+                    self.__create_schema(migrate_from)
+
+    def stories(self, shelf_name: str=None) -> List[StoryEntry]:
+        if shelf_name is None:
+            return self.__select_stories('FROM stories ORDER BY rowid')
+
+        return self.__select_stories('FROM shelf_stories JOIN shelves ON shelves.coid = shelf_stories.shelf '
+            + 'JOIN stories ON stories.coid = shelf_stories.story '
+            + 'WHERE shelves.name = ? ORDER BY shelf_stories.rowid', (shelf_name,), prefix='stories.')
+
+    @property
+    def bookshelves(self) -> List[Bookshelf]:
+        return [ SqliteBookshelf(self._db, name, BookshelfConfigIdentifer(coid))
+            for coid, name in self._db.execute('SELECT coid, name FROM shelves ORDER BY rowid') ]
+
+    def add_story(self, story: StoryEntry, shelves=None) -> None:
+        row = (str(story.coid), story.id, story.handle, story.title, story.last_read)
+
+        with _transaction(self._db):
+            current = self._db.execute(f'SELECT {SqliteConfig.__STORY_COLUMNS} FROM stories WHERE coid = ?',
+                (row[0],)).fetchone()
+
+            # Just updating the entry, if anything actually changed.
+            if current is not None:
+                if current != row:
+                    self._db.execute('UPDATE stories SET id = ?, handle = ?, title = ?, last_read = ?, '
+                        + 'handle_key = ?, title_key = ? WHERE coid = ?',
+                        (*row[1:], *SqliteConfig.__keys(story), row[0]))
+                return
+
+            # Not an exact match, ensure uniqueness on id.
+            if entry := self.fetch_story(id=story.id):
+                self.__delete_story(entry)
+
+            self.__insert_story(story)
+
+    def remove_story(self, **kwargs):
+        with _transaction(self._db):
+            if entry := self.fetch_story(**kwargs):
+                self.__delete_story(entry)
+
+    def fetch_story(self, **kwargs) -> StoryEntry:
+
+        id = kwargs.pop('id', None)
+        handle = kwargs.pop('handle', None)
+        title = kwargs.pop('title', None)
+
+        if kwargs not in ({}, None):
+            raise ValueError(f'StoryEntry does not have the following identifiable fields: {kwargs.keys()}')
+
+        # The most specific identifier given wins: title, then handle, then id.
+        if isinstance(title, str):
+            column, value = 'title_key', title.casefold()
+        elif isinstance(handle, str):
+            column, value = 'handle_key', handle.casefold()
+        elif isinstance(id, int):
+            column, value = 'id', id
+        else:
+            return None
+
+        stories = self.__select_stories(f'FROM stories WHERE {column} = ? ORDER BY rowid LIMIT 1', (value,))
+        return stories[0] if stories else None
+
+    def create_bookshelf(self, name: str):
+        with _transaction(self._db):
+            return self._db.execute('INSERT OR IGNORE INTO shelves (coid, name) VALUES (?, ?)',
+                (str(BookshelfConfigIdentifer()), name)).rowcount == 1
+
+    def delete_bookshelf(self, name: str):
+        with _transaction(self._db):
+            if (shelf := self.fetch_bookshelf(name)) is None:
+                return False
+
+            self._db.execute('DELETE FROM shelf_stories WHERE shelf = ?', (str(shelf.coid),))
+            self._db.execute('DELETE FROM shelves WHERE coid = ?', (str(shelf.coid),))
+            return True
+
+    def fetch_bookshelf(self, name: str) -> Bookshelf:
+        if row := self._db.execute('SELECT coid FROM shelves WHERE name = ?', (name,)).fetchone():
+            return SqliteBookshelf(self._db, name, BookshelfConfigIdentifer(row[0]))
+        return None
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_val, tb):
+        # Nothing to flush, every change was committed as it was made.
+        self.close()
+
+    def __create_schema(self, migrate_from: Optional[str]) -> None:
+        # Not executescript(), which would commit and drop the write lock.
+        for statement in SqliteConfig.__SCHEMA.split(';'):
+            self._db.execute(statement)
+
+        if migrate_from is not None and exists(migrate_from):
+            legacy = Config(migrate_from)
+            try:
+                for story in legacy.stories():
+                    self.__insert_story(story)
+
+                for shelf in legacy.bookshelves:
+                    self._db.execute('INSERT OR IGNORE INTO shelves (coid, name) VALUES (?, ?)',
+                        (str(shelf.coid), shelf.name))
+                    self._db.executemany('INSERT OR IGNORE INTO shelf_stories (shelf, story) VALUES (?, ?)',
+                        ((str(shelf.coid), str(coid)) for coid in shelf.get_references()))
+            finally:
+                legacy.close()
+
+        self._db.execute(f'PRAGMA user_version = {SqliteConfig.__SCHEMA_VERSION}')
+
+    def __insert_story(self, story: StoryEntry) -> None:
+        self._db.execute('INSERT INTO stories VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (str(story.coid), story.id, story.handle, story.title, story.last_read, *SqliteConfig.__keys(story)))
+
+    def __delete_story(self, entry: StoryEntry) -> None:
+        self._db.execute('DELETE FROM shelf_stories WHERE story = ?', (str(entry.coid),))
+        self._db.execute('DELETE FROM stories WHERE coid = ?', (str(entry.coid),))
+
+    def __select_stories(self, clause: str, parameters: Tuple=(), prefix: str='') -> List[StoryEntry]:
+        columns = ', '.join(f'{prefix}{column}' for column in SqliteConfig.__STORY_COLUMNS.split(', '))
+        return [ StoryEntry(id, handle, title, last_read, coid=StoryEntryConfigIdentifier(coid))
+            for coid, id, handle, title, last_read in self._db.execute(f'SELECT {columns} {clause}', parameters) ]
+
+    @staticmethod
+    def __keys(story: StoryEntry) -> Tuple[Optional[str], Optional[str]]:
+        return (story.handle.casefold() if isinstance(story.handle, str) else None,
+            story.title.casefold() if isinstance(story.title, str) else None)
+
+
+@contextmanager
+def _transaction(db: Connection) -> Iterator[None]:
+    # Nested uses join the transaction that is already open.
+    if db.in_transaction:
+        yield
+        return
+
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+    else:
+        db.execute('COMMIT')
@@ -1,13 +1,27 @@
 
-from argparse import ArgumentParser
-from typing import Callable, Optional
+from argparse import ArgumentParser, ArgumentTypeError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from os.path import join
+from time import perf_counter
+from typing import TYPE_CHECKING, Callable, List, NamedTuple, Optional, Tuple
 
 from webnovelparser.cmdline.config import Config
 from webnovelparser.cmdline.config.entry import StoryEntry
-from webnovelparser.cmdline.util import compute_chapter_info, story_entry_factory, show_updates, get_chapter_bounds
-from webnovelparser.epub.builder import EpubBuilder, EpubBuilderArguments
-from webnovelparser.epub.webnovel import RoyalRoadWebNovel
+from webnovelparser.cmdline.util import compute_chapter_info, story_cache_factory, web_session_factory, story_entry_factory, show_updates, get_chapter_bounds
+from webnovelparser.epub.defaults import BUILDER_ENGINES, DEFAULT_POOL_SIZE
 
+if TYPE_CHECKING: # Imported where used; see util.py.
+    from webnovelparser.epub.builder import EpubBuilder, EpubBuilderArguments
+    from webnovelparser.epub.session import WebSession
+    from webnovelparser.epub.webnovel import RoyalRoadWebNovel
+
+
+class _BatchResult(NamedTuple):
+    story: StoryEntry
+    chapters: str
+    status: str
+    seconds: float = 0.0
+    filename: str = ''
 
 def command_parser(config: Config, parser_factory: Callable[[], ArgumentParser]):
     parser = parser_factory()
@@ -18,7 +32,56 @@ def command_parser(config: Config, parser_factory: Callable[[], ArgumentParser])
 
     return lambda _: parser.print_help(), parser
 
-def __show_update_and_get_confirmation(novel: RoyalRoadWebNovel,
+def add_builder_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument('--engine', type=str, dest='ENGINE',
+        choices=BUILDER_ENGINES, default='threads')
+    parser.add_argument('-w', '--workers', type=int, dest='WORKERS',
+        default=DEFAULT_POOL_SIZE)
+    parser.add_argument('--image-format', type=str, dest='IMAGE_FORMATS',
+        action='append', default=[])
+    parser.add_argument('--max-image-size', type=__resolution, dest='MAX_IMAGE_SIZE')
+    parser.add_argument('--image-quality', type=int, dest='IMAGE_QUALITY', default=85)
+    parser.add_argument('--text-only', dest='TEXT_ONLY', action='store_true')
+    parser.add_argument('--append', dest='APPEND', action='store_true')
+    parser.add_argument('--epub3', dest='EPUB3', action='store_true')
+    parser.add_argument('--window', type=int, dest='WINDOW')
+
+def __resolution(value: str) -> Tuple[int, int]:
+    try:
+        width, _, height = value.lower().partition('x')
+        return int(width), int(height or width)
+    except ValueError:
+        raise ArgumentTypeError(f'Invalid resolution "{value}", expected WIDTHxHEIGHT.')
+
+def __builder_arguments(args_namespace, start: int, end: int, filename: str) -> 'EpubBuilderArguments':
+    from webnovelparser.epub.builder import EpubBuilderArguments
+    from webnovelparser.epub.imaging import ImageProcessingOptions
+
+    cache_dir = getattr(args_namespace, 'CACHE_DIR', None)
+
+    image_options = ImageProcessingOptions(
+        formats=tuple(args_namespace.IMAGE_FORMATS),
+        max_resolution=args_namespace.MAX_IMAGE_SIZE,
+        quality=args_namespace.IMAGE_QUALITY,
+        text_only=args_namespace.TEXT_ONLY,
+        cache_dir=join(cache_dir, 'images') if cache_dir else None
+    )
+
+    return EpubBuilderArguments(start, end, filename,
+        workers=args_namespace.WORKERS,
+        engine=args_namespace.ENGINE,
+        image_options=image_options,
+        append=args_namespace.APPEND,
+        store_path=join(cache_dir, 'chapters.sqlite') if cache_dir else None,
+        epub3=args_namespace.EPUB3,
+        window=args_namespace.WINDOW)
+
+def __filename(args_namespace, story_entry: StoryEntry, start: int, end: int) -> str:
+    if args_namespace.APPEND:
+        return f'./{story_entry.handle}.epub'
+    return f'./{story_entry.handle}_{start+1}_{end+1}.epub'
+
+def __show_update_and_get_confirmation(novel: 'RoyalRoadWebNovel',
     from_chapter: int, to_chapter: int) -> bool:
     
     if not show_updates(novel, from_chapter, to_chapter):
@@ -41,7 +104,7 @@ def __show_update_and_get_confirmation(novel: RoyalRoadWebNovel,
             except EOFError:
                 return False
 
-def __retrieve_and_set_name_override(novel: RoyalRoadWebNovel, start: Optional[int]=None, end: Optional[int]=None) -> None:
+def __retrieve_and_set_name_override(novel: 'RoyalRoadWebNovel', start: Optional[int]=None, end: Optional[int]=None) -> None:
     try:
         title_override = input('Override eBook title? Enter nothing to use the default.\n'
             + 'Any instance of $t will be replaced with the novel\'s title name.\n'
@@ -60,11 +123,17 @@ def __retrieve_and_set_name_override(novel: RoyalRoadWebNovel, start: Optional[i
 def __one_parser(config: Config, parser_factory: Callable[[str], ArgumentParser]):
 
     def action(args_namespace):
+        from webnovelparser.epub.builder import EpubBuilder
+        from webnovelparser.epub.webnovel import RoyalRoadWebNovel
+
+        session = web_session_factory(args_namespace)
 
         try:
             novel = RoyalRoadWebNovel(
                 args_namespace.STORY_ENTRY.id,
-                args_namespace.TITLE_OVERRIDE
+                args_namespace.TITLE_OVERRIDE,
+                session=session,
+                story_cache=story_cache_factory(args_namespace)
             )
         except Exception as e:
             print(f'Failed to fetch web novel, exception was: {e}')
@@ -79,15 +148,18 @@ def __one_parser(config: Config, parser_factory: Callable[[str], ArgumentParser]
 
         show_updates(novel, start, end)
 
-        if args_namespace.TITLE_OVERRIDE is None:
+        # A rolling EPUB covers the whole story, so it keeps the story's title.
+        if args_namespace.TITLE_OVERRIDE is None and not args_namespace.APPEND:
             __retrieve_and_set_name_override(novel, start, end)
 
         if args_namespace.FILENAME is None:
-            args_namespace.FILENAME = f"./{args_namespace.STORY_ENTRY.handle}_{start+1}_{end+1}.epub"
+            args_namespace.FILENAME = __filename(args_namespace, args_namespace.STORY_ENTRY, start, end)
 
-        EpubBuilder(EpubBuilderArguments(
-            start, end, args_namespace.FILENAME
+        EpubBuilder(__builder_arguments(
+            args_namespace, start, end, args_namespace.FILENAME
         ), novel).run()
+
+        print(f'HTTP session: {session.stats}')
         
         if end + 1 > args_namespace.STORY_ENTRY.last_read:
             config.add_story(args_namespace.STORY_ENTRY.with_value(last_read=end+1))
@@ -104,15 +176,99 @@ def __one_parser(config: Config, parser_factory: Callable[[str], ArgumentParser]
         nargs='?', dest="FILENAME")
     parser.add_argument('STORY_ENTRY', metavar='STORY_ID',
         type=story_entry_factory(config))
+    add_builder_arguments(parser)
 
     parser.set_defaults(run=action)
 
+def __default_title(novel: 'RoyalRoadWebNovel', start: int, end: int) -> str:
+    return f'{novel.metadata.title}{compute_chapter_info(novel, start, end)}'
+
+def build_story(args_namespace, story_entry: StoryEntry, novel: 'RoyalRoadWebNovel',
+    start: int, end: int) -> Tuple['EpubBuilder', str, float]:
+
+    from webnovelparser.epub.builder import EpubBuilder
+
+    # No prompts: the default title, and the default file name.
+    started = perf_counter()
+    if not args_namespace.APPEND:
+        novel.set_name_override(__default_title(novel, start, end))
+
+    filename = __filename(args_namespace, story_entry, start, end)
+    builder = EpubBuilder(__builder_arguments(args_namespace, start, end, filename), novel)
+    builder.run()
+    return builder, filename, perf_counter() - started
+
+def __batch_fetch(config: Config, stories: List[StoryEntry], session: 'WebSession',
+    args_namespace) -> List[_BatchResult]:
+
+    from webnovelparser.epub.webnovel import RoyalRoadWebNovel
+
+    # Every story shares the one session, so its limiter holds the whole batch
+    # to a single concurrency and rate budget, however many books are open.
+    results = {}
+    pending = []
+    story_cache = story_cache_factory(args_namespace)
+
+    with ThreadPoolExecutor(args_namespace.WORKERS) as executor:
+        checks = { executor.submit(RoyalRoadWebNovel, entry.id, session=session, story_cache=story_cache): entry
+            for entry in stories }
+
+        for future in as_completed(checks):
+            entry = checks[future]
+            try:
+                novel = future.result()
+            except Exception as e:
+                results[entry.coid] = _BatchResult(entry, '', f'check failed: {e}')
+                continue
+
+            start, end = get_chapter_bounds(None, None, entry.last_read, novel.metadata.num_chapters)
+            if end < start:
+                results[entry.coid] = _BatchResult(entry, '', 'up to date')
+            else:
+                pending.append((entry, novel, start, end))
+
+    with ThreadPoolExecutor(args_namespace.PARALLEL) as executor:
+        builds = { executor.submit(build_story, args_namespace, *job): job for job in pending }
+
+        for done, future in enumerate(as_completed(builds), start=1):
+            entry, novel, start, end = builds[future]
+            chapters = f'{start + 1}-{end + 1}'
+
+            try:
+                builder, filename, seconds = future.result()
+            except Exception as e:
+                result = _BatchResult(entry, chapters, f'failed: {e}')
+            else:
+                if builder.failed:
+                    # Left unread, so the next run picks the missing chapters up again.
+                    result = _BatchResult(entry, chapters, f'{builder.failed} chapter(s) failed', seconds, filename)
+                else:
+                    result = _BatchResult(entry, chapters, 'ok', seconds, filename)
+                    config.add_story(entry.with_value(last_read=end + 1))
+
+            results[entry.coid] = result
+            print(f'[{done}/{len(builds)}] {entry.handle}: {result.status}')
+
+    return [ results[entry.coid] for entry in stories ]
+
+def __print_summary(results: List[_BatchResult]) -> None:
+    rows = [ ('Story', 'Chapters', 'Status', 'Time', 'File') ]
+    rows += [ (result.story.handle, result.chapters, result.status,
+        f'{result.seconds:.1f}s' if result.seconds else '', result.filename) for result in results ]
+
+    widths = [ max(len(row[column]) for row in rows) for column in range(len(rows[0])) ]
+    for row in rows:
+        print('  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
+
 def __multi_parser(config: Config, parser_factory: Callable[[str], ArgumentParser]):
 
-    def fetch_one(story_entry: StoryEntry):
+    def fetch_one(story_entry: StoryEntry, session: 'WebSession', args_namespace):
+        from webnovelparser.epub.builder import EpubBuilder
+        from webnovelparser.epub.webnovel import RoyalRoadWebNovel
 
         try:
-            novel = RoyalRoadWebNovel(story_entry.id)
+            novel = RoyalRoadWebNovel(story_entry.id, session=session,
+                story_cache=story_cache_factory(args_namespace))
         except Exception as e:
             print(f'Failed to fetch web novel, exception was: {e}')
             return
@@ -126,31 +282,44 @@ def __multi_parser(config: Config, parser_factory: Callable[[str], ArgumentParse
         if not __show_update_and_get_confirmation(novel, start, end):
             return
         
-        filename = f"{story_entry.handle}_{start+1}_{end+1}.epub"
-        __retrieve_and_set_name_override(novel, start, end)
+        filename = __filename(args_namespace, story_entry, start, end)
+        if not args_namespace.APPEND:
+            __retrieve_and_set_name_override(novel, start, end)
 
-        EpubBuilder(EpubBuilderArguments(
-            start,
-            end,
-            filename
+        EpubBuilder(__builder_arguments(
+            args_namespace, start, end, filename
         ), novel).run()
 
         config.add_story(story_entry.with_value(last_read=novel.metadata.num_chapters))
+
+    def fetch_many(stories: List[StoryEntry], args_namespace):
+        session = web_session_factory(args_namespace)
+
+        if args_namespace.BATCH:
+            __print_summary(__batch_fetch(config, stories, session, args_namespace))
+            return
+
+        for story_entry in stories:
+            fetch_one(story_entry, session, args_namespace)
     
     def bookshelf(args_namespace):
         stories = config.stories(shelf_name=args_namespace.BOOKSHELF)
         stories.sort(key=lambda story: story.handle)
-
-        for story_entry in stories:
-            fetch_one(story_entry)
+        fetch_many(stories, args_namespace)
     
-    def all(_):
-        for story_entry in config.stories():
-            fetch_one(story_entry)
+    def all(args_namespace):
+        fetch_many(config.stories(), args_namespace)
+
+    def add_multi_arguments(parser: ArgumentParser):
+        add_builder_arguments(parser)
+        parser.add_argument('--batch', dest='BATCH', action='store_true')
+        parser.add_argument('--parallel', type=int, dest='PARALLEL', default=4)
 
     parser = parser_factory('all')
+    add_multi_arguments(parser)
     parser.set_defaults(run=all)
 
     parser = parser_factory('bookshelf')
     parser.add_argument('BOOKSHELF', type=str)
+    add_multi_arguments(parser)
     parser.set_defaults(run=bookshelf)
\ No newline at end of file
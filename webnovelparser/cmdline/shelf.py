@@ -5,7 +5,6 @@ from typing import Callable
 from webnovelparser.cmdline.config import Config, bookshelf
 from webnovelparser.cmdline.config.entry import StoryEntry
 from webnovelparser.cmdline.util import story_entry_factory, show_updates, get_chapter_bounds
-from webnovelparser.epub.webnovel import RoyalRoadWebNovel
 
 
 def command_parser(config: Config, parser_factory: Callable[[], ArgumentParser]):
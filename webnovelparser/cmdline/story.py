@@ -4,8 +4,7 @@ from typing import Callable
 
 from webnovelparser.cmdline.config import Config
 from webnovelparser.cmdline.config.entry import StoryEntry
-from webnovelparser.cmdline.util import compute_chapter_info, story_entry_factory, show_updates, get_chapter_bounds
-from webnovelparser.epub.webnovel import RoyalRoadWebNovel
+from webnovelparser.cmdline.util import compute_chapter_info, story_cache_factory, web_session_factory, story_entry_factory, show_updates, get_chapter_bounds
 
 
 def command_parser(config: Config, parser_factory: Callable[[], ArgumentParser]):
@@ -41,10 +40,14 @@ def __list_parser(config: Config, parser_factory: Callable[[str], ArgumentParser
 def __show_parser(config: Config, parser_factory: Callable[[str], ArgumentParser]):
 
     def action(args_namespace):
+        from webnovelparser.epub.webnovel import RoyalRoadWebNovel
+
         print(args_namespace.STORY_ENTRY)
         
         try:
-            novel = RoyalRoadWebNovel(args_namespace.STORY_ENTRY.id)
+            novel = RoyalRoadWebNovel(args_namespace.STORY_ENTRY.id,
+                session=web_session_factory(args_namespace),
+                story_cache=story_cache_factory(args_namespace))
         except Exception as e:
             print(f'Failed to fetch web novel, exception was: {e}')
             return
@@ -70,9 +73,12 @@ def __show_parser(config: Config, parser_factory: Callable[[str], ArgumentParser
 def __add_parser(config: Config, parser_factory: Callable[[str], ArgumentParser]):
     
     def action(args_namespace):
+        from webnovelparser.epub.webnovel import RoyalRoadWebNovel
 
         try:
-            novel = RoyalRoadWebNovel(args_namespace.STORY_ID)
+            novel = RoyalRoadWebNovel(args_namespace.STORY_ID,
+                session=web_session_factory(args_namespace),
+                story_cache=story_cache_factory(args_namespace))
         except Exception as e:
             print(f'Failed to fetch web novel, exception was: {e}')
             return
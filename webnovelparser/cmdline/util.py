@@ -1,10 +1,16 @@
 
+from os.path import join
 from re import search
-from typing import Callable, Optional, Tuple
+from typing import TYPE_CHECKING, Callable, Optional, Tuple
 
 from webnovelparser.cmdline.config import Config 
 from webnovelparser.cmdline.config.entry import StoryEntry
-from webnovelparser.epub.webnovel import RoyalRoadWebNovel
+from webnovelparser.epub.defaults import DEFAULT_POOL_SIZE
+
+if TYPE_CHECKING: # Imported where used; config-only commands never need them.
+    from webnovelparser.epub.cache import StoryPageCache
+    from webnovelparser.epub.session import WebSession
+    from webnovelparser.epub.webnovel import RoyalRoadWebNovel
 
 
 def get_chapter_bounds(starting: Optional[int], ending: Optional[int],
@@ -43,6 +49,31 @@ def get_chapter_bounds(starting: Optional[int], ending: Optional[int],
     # => (starting, ending) is (None, None)
     return last_read + 1, last_update
 
+def web_session_factory(args_namespace) -> 'WebSession':
+    from webnovelparser.epub.cache import HttpCache
+    from webnovelparser.epub.session import WebSession
+
+    cache = None
+    if (cache_dir := getattr(args_namespace, 'CACHE_DIR', None)) is not None:
+        cache = HttpCache(join(cache_dir, 'http'))
+
+    # A threaded build runs a chapter pool and an image pool of WORKERS threads
+    # each, and batch and watch runs share one session between PARALLEL builds.
+    workers = getattr(args_namespace, 'WORKERS', DEFAULT_POOL_SIZE)
+    threads = 2 * workers * (getattr(args_namespace, 'PARALLEL', None) or 1)
+
+    return WebSession(pool_size=workers, timeout=args_namespace.TIMEOUT, cache=cache,
+        rate=args_namespace.RATE, connections=threads)
+
+def story_cache_factory(args_namespace) -> Optional['StoryPageCache']:
+    from webnovelparser.epub.cache import StoryPageCache
+
+    if (cache_dir := getattr(args_namespace, 'CACHE_DIR', None)) is None:
+        return None
+
+    ttl = 0 if getattr(args_namespace, 'REFRESH', False) else args_namespace.STORY_TTL
+    return StoryPageCache(join(cache_dir, 'stories'), ttl=ttl)
+
 def story_entry_factory(config: Config) -> Callable[[str], StoryEntry]:
     
     def story_entry(identifier: str) -> StoryEntry:
@@ -71,7 +102,7 @@ def story_entry_factory(config: Config) -> Callable[[str], StoryEntry]:
 
     return story_entry
 
-def show_updates(novel: RoyalRoadWebNovel,
+def show_updates(novel: 'RoyalRoadWebNovel',
     from_chapter: int, to_chapter: int,
     flag_entries: Tuple[int]=()) -> bool:
     
@@ -91,7 +122,7 @@ def show_updates(novel: RoyalRoadWebNovel,
     
     return True
 
-def compute_chapter_info(novel: RoyalRoadWebNovel, start: Optional[int], end: Optional[int]):
+def compute_chapter_info(novel: 'RoyalRoadWebNovel', start: Optional[int], end: Optional[int]):
 
     def fetch_chapter_name(idx):
         if not isinstance(idx, int):
@@ -0,0 +1,227 @@
+
+from argparse import ArgumentParser
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from os.path import join
+from random import uniform
+from signal import SIG_DFL, SIGINT, SIGTERM, signal
+from threading import Event
+from time import monotonic, strftime
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Tuple
+
+from webnovelparser.cmdline.config import Config
+from webnovelparser.cmdline.config.entry import StoryEntry
+from webnovelparser.cmdline.fetch import add_builder_arguments, build_story
+from webnovelparser.cmdline.util import get_chapter_bounds, web_session_factory
+
+if TYPE_CHECKING: # Imported where used; see util.py.
+    from webnovelparser.epub.builder import EpubBuilder
+    from webnovelparser.epub.cache import StoryPageCache
+    from webnovelparser.epub.session import WebSession
+    from webnovelparser.epub.webnovel import ChapterList
+
+
+class _WatchedStory:
+
+    def __init__(self, story_id: int, interval: float, due: float) -> None:
+        self.story_id = story_id
+        self.interval = interval
+        self.due = due
+        self.chapter_list: Optional['ChapterList'] = None
+        self.busy = False
+
+class _Watcher:
+
+    # How often the tracked stories are re-read from the config, so stories
+    # added or removed by other commands are picked up without a restart.
+    __SYNC_INTERVAL = 60
+
+    # The longest the main loop sleeps, which bounds how long a SIGTERM waits.
+    __TICK = 1.0
+
+    def __init__(self, config: Config, args_namespace) -> None:
+        self._config = config
+        self._args = args_namespace
+        self._stopping = Event()
+        self._watched: Dict[int, _WatchedStory] = {}
+        self._polls: Dict[Future, _WatchedStory] = {}
+        self._builds: Dict[Future, Tuple[_WatchedStory, StoryEntry]] = {}
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def run(self) -> None:
+        from webnovelparser.epub.webnovel import RoyalRoadWebNovel
+
+        # One session and its caches live as long as the process, so
+        # connections, validators and parsed pages stay warm between polls.
+        session = web_session_factory(self._args)
+        story_cache = self.__story_cache()
+        next_sync = 0.0
+
+        with ThreadPoolExecutor(self._args.WORKERS) as poll_executor, \
+            ThreadPoolExecutor(self._args.PARALLEL) as build_executor:
+
+            while not self._stopping.is_set():
+                now = monotonic()
+                if now >= next_sync:
+                    self.__sync(now)
+                    next_sync = now + _Watcher.__SYNC_INTERVAL
+
+                for watched in self._watched.values():
+                    if not watched.busy and watched.due <= now:
+                        watched.busy = True
+                        self._polls[poll_executor.submit(RoyalRoadWebNovel.fetch_chapter_list,
+                            watched.story_id, session, watched.chapter_list)] = watched
+
+                pending = [ *self._polls, *self._builds ]
+                next_due = min((w.due for w in self._watched.values() if not w.busy), default=next_sync)
+                timeout = max(0.0, min(next_due, next_sync, now + _Watcher.__TICK) - now)
+
+                if pending:
+                    done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                else:
+                    done = ()
+                    self._stopping.wait(timeout)
+
+                for future in done:
+                    if future in self._polls:
+                        self.__poll_done(future, build_executor, session, story_cache)
+                    else:
+                        self.__build_done(future)
+
+            # Queued work is dropped; builds already running are seen through,
+            # so their last_read still gets saved.
+            for future in [ *self._polls, *self._builds ]:
+                future.cancel()
+
+            self.__log(f'Stopping, waiting on {sum(not f.cancelled() for f in self._builds)} build(s); '
+                + 'Ctrl-C again to abort.')
+            for future in wait(list(self._builds)).done:
+                if not future.cancelled():
+                    self.__build_done(future)
+
+    def __sync(self, now: float) -> None:
+        stories = { story.id: story for story in self._config.stories() }
+
+        for story_id in list(self._watched):
+            if story_id not in stories and not self._watched[story_id].busy:
+                del self._watched[story_id]
+
+        for story_id in stories:
+            if story_id not in self._watched:
+                # Spread the first polls out instead of sending them all at once.
+                self._watched[story_id] = _WatchedStory(story_id, self._args.INTERVAL,
+                    now + uniform(0, self._args.JITTER * self._args.INTERVAL))
+
+    def __poll_done(self, future: Future, build_executor: ThreadPoolExecutor,
+        session: 'WebSession', story_cache: Optional['StoryPageCache']) -> None:
+
+        watched = self._polls.pop(future)
+        # Re-read, another command may have fetched or removed the story.
+        entry = self._config.fetch_story(id=watched.story_id)
+
+        try:
+            watched.chapter_list = future.result()
+        except Exception as e:
+            self.__log(f'{entry.handle if entry else watched.story_id}: check failed, exception was: {e}')
+            self.__reschedule(watched, found_updates=False)
+            return
+
+        if entry is None or entry.last_read >= watched.chapter_list.num_chapters:
+            self.__reschedule(watched, found_updates=False)
+            return
+
+        self.__log(f'{entry.handle}: {watched.chapter_list.num_chapters - entry.last_read} new chapter(s), building.')
+        self._builds[build_executor.submit(self.__build, entry, session, story_cache)] = (watched, entry)
+
+    def __build(self, entry: StoryEntry, session: 'WebSession',
+        story_cache: Optional['StoryPageCache']) -> Optional[Tuple['EpubBuilder', str, float, int]]:
+
+        from webnovelparser.epub.webnovel import RoyalRoadWebNovel
+
+        novel = RoyalRoadWebNovel(entry.id, session=session, story_cache=story_cache)
+        start, end = get_chapter_bounds(None, None, entry.last_read, novel.metadata.num_chapters)
+        if end < start:
+            return None
+
+        return (*build_story(self._args, entry, novel, start, end), end)
+
+    def __build_done(self, future: Future) -> None:
+        watched, entry = self._builds.pop(future)
+        built = False
+
+        try:
+            result = future.result()
+        except Exception as e:
+            self.__log(f'{entry.handle}: build failed, exception was: {e}')
+        else:
+            if result is not None:
+                builder, filename, seconds, end = result
+                if builder.failed:
+                    # Left unread, so the next poll builds the range again.
+                    self.__log(f'{entry.handle}: {builder.failed} chapter(s) failed in {filename}.')
+                else:
+                    self.__log(f'{entry.handle}: wrote {filename} in {seconds:.1f}s.')
+                    built = True
+                    if (current := self._config.fetch_story(id=entry.id)) and current.last_read < end + 1:
+                        self._config.add_story(current.with_value(last_read=end + 1))
+
+        # A failing build backs off like a quiet story, rather than being
+        # retried at the base interval forever.
+        self.__reschedule(watched, found_updates=built)
+
+    def __reschedule(self, watched: _WatchedStory, found_updates: bool) -> None:
+        # Stories that keep coming up empty are polled less and less often;
+        # one that updated goes back to the base interval.
+        if found_updates:
+            watched.interval = self._args.INTERVAL
+        else:
+            watched.interval = min(watched.interval * 2, self._args.MAX_INTERVAL)
+
+        jitter = self._args.JITTER
+        watched.due = monotonic() + watched.interval * uniform(1 - jitter, 1 + jitter)
+        watched.busy = False
+
+    def __story_cache(self) -> Optional['StoryPageCache']:
+        from webnovelparser.epub.cache import StoryPageCache
+
+        if (cache_dir := getattr(self._args, 'CACHE_DIR', None)) is None:
+            return None
+        # A poll has just seen new chapters, so the cached page is always
+        # revalidated; an unchanged one still costs only a 304.
+        return StoryPageCache(join(cache_dir, 'stories'), ttl=0)
+
+    @staticmethod
+    def __log(message: str) -> None:
+        print(f'{strftime("%Y-%m-%d %H:%M:%S")} {message}', flush=True)
+
+
+def command_parser(config: Config, parser_factory: Callable[[], ArgumentParser]):
+
+    def action(args_namespace):
+        if args_namespace.INTERVAL <= 0 or args_namespace.MAX_INTERVAL < args_namespace.INTERVAL:
+            raise ValueError('Poll intervals must be positive, with --max-interval no less than --interval.')
+        if not 0 <= args_namespace.JITTER < 1:
+            raise ValueError(f'Jitter must be in [0, 1), got {args_namespace.JITTER}.')
+
+        watcher = _Watcher(config, args_namespace)
+
+        def interrupt(*_):
+            # The first Ctrl-C drains running builds; a second one kills the
+            # process outright instead of waiting on them.
+            signal(SIGINT, SIG_DFL)
+            watcher.stop()
+
+        signal(SIGTERM, lambda *_: watcher.stop())
+        signal(SIGINT, interrupt)
+
+        watcher.run()
+
+    parser = parser_factory()
+    parser.add_argument('--interval', type=float, dest='INTERVAL', default=30 * 60)
+    parser.add_argument('--max-interval', type=float, dest='MAX_INTERVAL', default=12 * 60 * 60)
+    parser.add_argument('--jitter', type=float, dest='JITTER', default=0.1)
+    parser.add_argument('--parallel', type=int, dest='PARALLEL', default=2)
+    add_builder_arguments(parser)
+
+    return action, parser
@@ -1,16 +1,29 @@
-
+from asyncio import Semaphore, ensure_future, gather, get_running_loop, run as run_coroutine
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
-from threading import Lock
+from contextlib import nullcontext
+from os import cpu_count
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
 
+from webnovelparser.epub.defaults import BUILDER_ENGINES, DEFAULT_POOL_SIZE
+from webnovelparser.epub.imaging import ImageProcessingOptions, ImageProcessor
+from webnovelparser.epub.parsing import get_html_parser
+from webnovelparser.epub.profiling import count, stage
+from webnovelparser.epub.resources import CompactChapter, ImageRegistry, NovelImage
+from webnovelparser.epub.store import ChapterStore
 from webnovelparser.epub.writer import EpubFile
 
 
+_Handle = TypeVar('_Handle')
+
 class EpubBuilderArguments:
-    
+
+    ENGINES = BUILDER_ENGINES
+
     @property
     def starting_chapter(self) -> int:
         return self._starting_chapter
-    
+
     @property
     def ending_chapter(self) -> int:
         return self._ending_chapter
@@ -19,10 +32,56 @@ class EpubBuilderArguments:
     def filename(self) -> str:
         return self._filename
 
-    def __init__(self, starting_chapter: int, ending_chapter: int, filename: str) -> None:
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    @property
+    def engine(self) -> str:
+        return self._engine
+
+    @property
+    def image_options(self) -> ImageProcessingOptions:
+        return self._image_options
+
+    @property
+    def append(self) -> bool:
+        return self._append
+
+    @property
+    def store_path(self) -> Optional[str]:
+        return self._store_path
+
+    @property
+    def epub3(self) -> bool:
+        return self._epub3
+
+    @property
+    def window(self) -> int:
+        return self._window
+
+    def __init__(self, starting_chapter: int, ending_chapter: int, filename: str,
+        workers: int=DEFAULT_POOL_SIZE, engine: str='threads',
+        image_options: Optional[ImageProcessingOptions]=None, append: bool=False,
+        store_path: Optional[str]=None, epub3: bool=False, window: Optional[int]=None) -> None:
+
+        if engine not in EpubBuilderArguments.ENGINES:
+            raise ValueError(f'Unknown builder engine "{engine}", expected one of {EpubBuilderArguments.ENGINES}.')
+        if workers < 1:
+            raise ValueError(f'Worker count must be positive, got {workers}.')
+        if window is not None and window < 1:
+            raise ValueError(f'Reorder window must be positive, got {window}.')
+
         self._starting_chapter = starting_chapter
         self._ending_chapter = ending_chapter
         self._filename = filename
+        self._workers = workers
+        self._engine = engine
+        self._image_options = image_options or ImageProcessingOptions()
+        self._append = append
+        self._store_path = store_path
+        self._epub3 = epub3
+        self._window = window or 2 * workers
 
 class EpubBuilder:
 
@@ -37,24 +96,162 @@ class EpubBuilder:
 
         self._options = options
         self._novel = novel
-    
+        self._written = 0
+        self._failed = 0
+
+    @property
+    def written(self) -> int:
+        return self._written
+
+    @property
+    def failed(self) -> int:
+        return self._failed
+
     def run(self) -> int:
 
-        with EpubFile(self._novel.metadata, self._options.filename) as epub:
-            epub_lock = Lock()
+        with ImageProcessor(self._options.image_options) as processor, \
+            self.__open_store() as store, \
+            EpubFile(self._novel.metadata, self._options.filename,
+                append=self._options.append, epub3=self._options.epub3) as epub:
 
-            def fetch_and_add_chapter(idx: int) -> None:
+            self._images = ImageRegistry(processor)
+            self._store = store
+            # When appending, whatever the archive already holds is kept as is.
+            self._existing_chapters = frozenset(epub.chapter_indices)
+            self._stored_titles = store.stored_titles(self._novel.story_id) if store else {}
+            if not epub.has_cover:
+                with stage('build.cover'):
+                    epub.add_cover(self.__get_cover_image())
 
+            if self._options.engine == 'asyncio':
+                run_coroutine(self.__add_chapters_asyncio(epub))
+            else:
+                self.__add_chapters_threaded(epub)
+
+        return self._written
+
+    def __get_cover_image(self) -> Optional[NovelImage]:
+        if (cover := self._novel.get_cover_image()) is None:
+            return None
+        if not self._images.transcodes:
+            return cover
+
+        content_type, content = self._images.process(cover.content_type, cover.content)
+        cover.release()
+        return NovelImage(cover.id, f'Images/Cover.{content_type.split("/")[1]}', content_type, content)
+
+    def __open_store(self):
+        if self._options.store_path is None:
+            return nullcontext()
+
+        image_options = self._options.image_options
+        images = 'text-only' if image_options.text_only else image_options.signature()
+        return ChapterStore(self._options.store_path, f'{get_html_parser()};{images}')
+
+    def __chapter_indices(self) -> List[int]:
+        return [ idx for idx in range(self._options.starting_chapter, self._options.ending_chapter + 1)
+            if idx not in self._existing_chapters ]
+
+    def __missing_indices(self) -> List[int]:
+        # Only chapters the store can't supply are downloaded.
+        return [ idx for idx in self.__chapter_indices()
+            if self._stored_titles.get(self._novel.peek_chapter_href(idx)) != self._novel.peek_chapter_title(idx) ]
+
+    def __load_stored(self, idx: int) -> CompactChapter:
+        chapter = self._store.load(self._novel.story_id, self._novel.peek_chapter_href(idx),
+            idx, self._novel.peek_chapter_title(idx))
+        if chapter is None:
+            raise ValueError(f'Chapter#{idx} is no longer in the chapter store.')
+        return chapter
+
+    def __in_order(self, submit: Callable[[int], _Handle]) -> Iterator[Tuple[int, Optional[_Handle]]]:
+        # Downloads run at most `window` chapters ahead of the writer, and are
+        # handed back strictly in reading order; a slow chapter stalls new
+        # submissions rather than letting finished ones pile up behind it.
+        missing = deque(self.__missing_indices())
+        pending: Dict[int, _Handle] = {}
+
+        for idx in self.__chapter_indices():
+            while missing and len(pending) < self._options.window:
+                next_idx = missing.popleft()
+                pending[next_idx] = submit(next_idx)
+
+            yield idx, pending.pop(idx, None)
+
+    def __write_chapter(self, epub: EpubFile, chapter: CompactChapter, fetched: bool) -> None:
+        if self._store is not None and fetched:
+            with stage('store.save'):
+                self._store.store(self._novel.story_id, self._novel.peek_chapter_href(chapter.index), chapter)
+        epub.add_chapter(chapter)
+        self._written += 1
+
+    def __add_chapters_threaded(self, epub: EpubFile) -> None:
+
+        # Images get their own pool; a chapter worker waiting on its images
+        # must never hold up the slot one of those downloads needs.
+        with ThreadPoolExecutor(self._options.workers) as executor, \
+            ThreadPoolExecutor(self._options.workers) as image_executor:
+
+            def fetch_chapter(idx: int) -> CompactChapter:
+                chapter = self._novel.get_chapter(idx)
+                chapter.fetch_images(self._images, image_executor)
+                return chapter.compact()
+
+            for idx, future in self.__in_order(lambda idx: executor.submit(fetch_chapter, idx)):
                 try:
-                    chapter = self._novel.get_chapter(idx)
+                    # Time the writer spends stalled on the next chapter in order.
+                    with stage('build.writer_wait'):
+                        chapter = future.result() if future is not None else self.__load_stored(idx)
                 except Exception as e:
                     print(f'Failed to fetch chapter#{idx}, skipping. Exception was:\n{e}')
+                    self._failed += 1
+                    count('build.failed_chapters')
                 else:
-                    with epub_lock:
-                        epub.add_chapter(chapter)
+                    self.__write_chapter(epub, chapter, fetched=future is not None)
+
+    async def __add_chapters_asyncio(self, epub: EpubFile) -> None:
+        # requests is blocking, so network calls run on an I/O pool sized to the
+        # in-flight limit; the coroutines only schedule them. Parsing gets its
+        # own small pool so it never competes with downloads for a slot, and
+        # zip and store I/O go through a single writer thread so they never
+        # stall the loop.
+        loop = get_running_loop()
+        in_flight = Semaphore(self._options.workers)
 
-            epub.add_cover(self._novel.get_cover_image())
+        with ThreadPoolExecutor(self._options.workers) as io_pool, \
+            ThreadPoolExecutor(min(self._options.workers, cpu_count() or 1)) as parse_pool, \
+            ThreadPoolExecutor(1) as write_pool:
 
-            with ThreadPoolExecutor(10) as executor:
-                for idx in range(self._options.starting_chapter, self._options.ending_chapter + 1):
-                    executor.submit(fetch_and_add_chapter, idx)
\ No newline at end of file
+            async def fetch(fn, *args):
+                async with in_flight:
+                    return await loop.run_in_executor(io_pool, fn, *args)
+
+            async def fetch_chapter(idx: int) -> CompactChapter:
+                response = await fetch(self._novel.fetch_chapter_page, idx)
+                chapter = await loop.run_in_executor(parse_pool,
+                    self._novel.parse_chapter_page, idx, response)
+
+                if self._images.text_only:
+                    chapter.drop_images()
+                else:
+                    sources = list(dict.fromkeys(chapter.image_sources()))
+                    with stage('chapter.images'):
+                        images = await gather(*(fetch(self._images.fetch, src, self._novel.session)
+                            for src in sources), return_exceptions=True)
+                    # A failed image is dropped by attach_images(), like a missing one.
+                    chapter.attach_images({ src: image for src, image in zip(sources, images)
+                        if not isinstance(image, BaseException) })
+
+                return await loop.run_in_executor(parse_pool, chapter.compact)
+
+            for idx, task in self.__in_order(lambda idx: ensure_future(fetch_chapter(idx))):
+                try:
+                    with stage('build.writer_wait'):
+                        chapter = (await task) if task is not None else \
+                            await loop.run_in_executor(write_pool, self.__load_stored, idx)
+                except Exception as e:
+                    print(f'Failed to fetch chapter#{idx}, skipping. Exception was:\n{e}')
+                    self._failed += 1
+                    count('build.failed_chapters')
+                else:
+                    await loop.run_in_executor(write_pool, self.__write_chapter, epub, chapter, task is not None)
@@ -0,0 +1,262 @@
+from collections import OrderedDict
+from hashlib import sha256
+from json import JSONDecodeError, dump, load
+from os import remove, scandir, utime
+from os.path import join
+from threading import Lock
+from time import time
+from typing import Callable, Dict, Optional
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from webnovelparser.epub.defaults import DEFAULT_STORY_TTL
+from webnovelparser.epub.files import atomic_write
+from webnovelparser.epub.profiling import locked
+
+
+class HttpCacheStats:
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __str__(self) -> str:
+        return (f'{self.hits} hits, {self.revalidated} revalidated, '
+            + f'{self.misses} misses, {self.evictions} evictions')
+
+def _validators(etag: Optional[str], last_modified: Optional[str]) -> Dict[str, str]:
+    headers = {}
+
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    return headers
+
+def validators_for(response: Response) -> Dict[str, str]:
+    return _validators(response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+class _CacheEntry:
+
+    def __init__(self, key: str, meta: dict) -> None:
+        self.key = key
+        self.meta = meta
+
+    @property
+    def size(self) -> int:
+        return self.meta.get('size', 0)
+
+    def is_fresh(self, max_age: float) -> bool:
+        return (time() - self.meta.get('stored', 0)) < max_age
+
+    def validators(self) -> Dict[str, str]:
+        return _validators(self.meta.get('etag'), self.meta.get('last_modified'))
+
+class HttpCache:
+
+    def __init__(self, directory: str, max_size: int=512 * 1024 * 1024) -> None:
+        self._directory = directory
+        self._max_size = max_size
+        self._lock = Lock()
+        self._stats = HttpCacheStats()
+
+        # Ordered least to most recently used; loaded lazily on first access.
+        self._entries: Optional[OrderedDict] = None
+        self._total_size = 0
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    @property
+    def stats(self) -> HttpCacheStats:
+        return self._stats
+
+    def fetch(self, url: str, getter: Callable[..., Response], max_age: float=0) -> Response:
+        # Entries younger than max_age are served straight from disk; anything
+        # older is revalidated with the stored ETag/Last-Modified validators.
+        entry = self.__lookup(url)
+
+        if entry is not None and entry.is_fresh(max_age):
+            if (response := self.__load_response(entry)) is not None:
+                self.__count('hits')
+                return response
+
+        response = getter(url, headers=entry.validators() if entry else {})
+
+        if response.status_code == 304 and entry is not None:
+            if (cached := self.__load_response(entry)) is not None:
+                self.__count('revalidated')
+                self.__store_meta(entry.key, { **entry.meta, 'stored': time() })
+                return cached
+
+            # The body vanished from under us, so fetch it unconditionally.
+            response = getter(url)
+
+        self.__count('misses')
+
+        if response.status_code == 200:
+            self.__store(url, response)
+
+        return response
+
+    def clear(self) -> None:
+        with locked(self._lock, 'http_cache'):
+            for key in list(self.__index().keys()):
+                self.__remove_files(key)
+            self._entries.clear()
+            self._total_size = 0
+
+    def __lookup(self, url: str) -> Optional[_CacheEntry]:
+        key = HttpCache.__key(url)
+
+        with locked(self._lock, 'http_cache'):
+            if key not in self.__index():
+                return None
+            self._entries.move_to_end(key)
+
+        try:
+            with open(self.__path(key, 'json'), 'r') as fobj:
+                return _CacheEntry(key, load(fobj))
+        except (OSError, JSONDecodeError):
+            self.__forget(key)
+            return None
+
+    def __load_response(self, entry: _CacheEntry) -> Optional[Response]:
+        try:
+            with open(self.__path(entry.key, 'body'), 'rb') as fobj:
+                content = fobj.read()
+            # Keep the on-disk recency in step, it seeds the LRU order next run.
+            utime(self.__path(entry.key, 'body'))
+        except OSError:
+            self.__forget(entry.key)
+            return None
+
+        response = Response()
+        response._content = content
+        response._content_consumed = True
+        response.status_code = 200
+        response.url = entry.meta.get('final_url', entry.meta.get('url'))
+        response.encoding = entry.meta.get('encoding')
+        response.headers = CaseInsensitiveDict(entry.meta.get('headers', {}))
+        return response
+
+    def __store(self, url: str, response: Response) -> None:
+        key = HttpCache.__key(url)
+        content = response.content
+
+        meta = {
+            'url': url,
+            'final_url': response.url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'encoding': response.encoding,
+            'headers': { name: response.headers[name] for name in ('Content-Type',)
+                if name in response.headers },
+            'size': len(content),
+            'stored': time()
+        }
+
+        with atomic_write(self.__path(key, 'body')) as fobj:
+            fobj.write(content)
+        self.__store_meta(key, meta)
+
+        with locked(self._lock, 'http_cache'):
+            index = self.__index()
+            self._total_size -= index.pop(key, 0)
+            index[key] = len(content)
+            self._total_size += len(content)
+            self.__evict()
+
+    def __store_meta(self, key: str, meta: dict) -> None:
+        with atomic_write(self.__path(key, 'json'), 'w') as fobj:
+            dump(meta, fobj)
+
+    def __evict(self) -> None:
+        # Caller holds self._lock.
+        while self._total_size > self._max_size and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_size -= size
+            self._stats.evictions += 1
+            self.__remove_files(key)
+
+    def __count(self, counter: str) -> None:
+        with locked(self._lock, 'http_cache'):
+            setattr(self._stats, counter, getattr(self._stats, counter) + 1)
+
+    def __forget(self, key: str) -> None:
+        with locked(self._lock, 'http_cache'):
+            self._total_size -= self.__index().pop(key, 0)
+        self.__remove_files(key)
+
+    def __remove_files(self, key: str) -> None:
+        for suffix in ('body', 'json'):
+            try:
+                remove(self.__path(key, suffix))
+            except OSError:
+                pass
+
+    def __index(self) -> OrderedDict:
+        # Caller holds self._lock.
+        if self._entries is not None:
+            return self._entries
+
+        found = []
+        try:
+            for dir_entry in scandir(self._directory):
+                if dir_entry.name.endswith('.body'):
+                    stat = dir_entry.stat()
+                    found.append((stat.st_mtime, dir_entry.name[:-len('.body')], stat.st_size))
+        except FileNotFoundError:
+            pass
+
+        found.sort()
+        self._entries = OrderedDict((key, size) for _, key, size in found)
+        self._total_size = sum(self._entries.values())
+        self.__evict()
+        return self._entries
+
+    def __path(self, key: str, suffix: str) -> str:
+        return join(self._directory, f'{key}.{suffix}')
+
+    @staticmethod
+    def __key(url: str) -> str:
+        return sha256(url.encode('utf-8')).hexdigest()
+
+
+class StoryPageCache:
+
+    # What a story page parses to, kept as one small JSON record per story.
+    # Records younger than the TTL stand in for the page outright.
+    def __init__(self, directory: str, ttl: float=DEFAULT_STORY_TTL) -> None:
+        self._directory = directory
+        self._ttl = ttl
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    @property
+    def ttl(self) -> float:
+        return self._ttl
+
+    def load(self, story_id) -> Optional[dict]:
+        try:
+            with open(self.__path(story_id), 'r') as fobj:
+                return load(fobj)
+        except (OSError, JSONDecodeError):
+            return None
+
+    def is_fresh(self, record: dict) -> bool:
+        return (time() - record.get('stored', 0)) < self._ttl
+
+    def store(self, story_id, record: dict) -> None:
+        with atomic_write(self.__path(story_id), 'w') as fobj:
+            dump({ **record, 'stored': time() }, fobj, separators=(',', ':'))
+
+    def __path(self, story_id) -> str:
+        return join(self._directory, f'{story_id}.json')
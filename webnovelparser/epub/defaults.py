@@ -0,0 +1,15 @@
+# Kept free of third-party imports, so the command line can build its
+# argument parser without loading the HTTP and parsing stacks.
+from importlib.util import find_spec
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = (10, 60)
+DEFAULT_RATE = 20.0
+DEFAULT_MAX_ATTEMPTS = 15
+DEFAULT_STORY_TTL = 15 * 60
+
+BUILDER_ENGINES = ('threads', 'asyncio')
+
+# BeautifulSoup tree builders that can actually be used here; html5lib is
+# never a dependency, so it is only offered when it happens to be installed.
+HTML_PARSERS = ('lxml', 'html.parser') + (('html5lib',) if find_spec('html5lib') is not None else ())
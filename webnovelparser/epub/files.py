@@ -0,0 +1,26 @@
+from contextlib import contextmanager
+from os import getpid, makedirs, remove, replace
+from os.path import dirname
+from threading import get_ident
+from typing import IO, Iterator
+
+
+@contextmanager
+def atomic_write(path: str, mode: str='wb') -> Iterator[IO]:
+    # Written beside the target under a name no other process or thread uses,
+    # then renamed over it; readers see the old file or the new one, never
+    # half of either.
+    if directory := dirname(path):
+        makedirs(directory, exist_ok=True)
+
+    tmp_path = f'{path}.{getpid()}.{get_ident()}.tmp'
+    try:
+        with open(tmp_path, mode) as fobj:
+            yield fobj
+        replace(tmp_path, path)
+    except BaseException:
+        try:
+            remove(tmp_path)
+        except OSError:
+            pass
+        raise
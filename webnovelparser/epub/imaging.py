@@ -0,0 +1,163 @@
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha256
+from io import BytesIO
+from os.path import join
+from typing import Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError: # Pillow is optional, see the 'images' extra.
+    Image = None
+
+from webnovelparser.epub.files import atomic_write
+
+
+# Pillow format names for the content types an EPUB reader can display.
+_FORMATS = {
+    'image/jpeg': 'JPEG',
+    'image/png': 'PNG',
+    'image/gif': 'GIF',
+    'image/webp': 'WEBP'
+}
+
+class ImageProcessingOptions:
+
+    @property
+    def formats(self) -> Tuple[str, ...]:
+        return self._formats
+
+    @property
+    def max_resolution(self) -> Optional[Tuple[int, int]]:
+        return self._max_resolution
+
+    @property
+    def quality(self) -> int:
+        return self._quality
+
+    @property
+    def text_only(self) -> bool:
+        return self._text_only
+
+    @property
+    def cache_dir(self) -> Optional[str]:
+        return self._cache_dir
+
+    @property
+    def transcodes(self) -> bool:
+        return not self._text_only and (bool(self._formats) or self._max_resolution is not None)
+
+    def signature(self) -> str:
+        return f'{",".join(self._formats)};{self._max_resolution};{self._quality}'
+
+    def __init__(self, formats: Tuple[str, ...]=(), max_resolution: Optional[Tuple[int, int]]=None,
+        quality: int=85, text_only: bool=False, cache_dir: Optional[str]=None) -> None:
+
+        formats = tuple(f if f.startswith('image/') else f'image/{f.lower()}' for f in formats)
+        formats = tuple('image/jpeg' if f == 'image/jpg' else f for f in formats)
+
+        for content_type in formats:
+            if content_type not in _FORMATS:
+                raise ValueError(f'Unsupported image format "{content_type}", expected one of {tuple(_FORMATS)}.')
+        if not 1 <= quality <= 100:
+            raise ValueError(f'Image quality must be between 1 and 100, got {quality}.')
+
+        self._formats = formats
+        self._max_resolution = max_resolution
+        self._quality = quality
+        self._text_only = text_only
+        self._cache_dir = cache_dir
+
+def _transcode(content: bytes, content_type: str, formats: Tuple[str, ...],
+    max_resolution: Optional[Tuple[int, int]], quality: int) -> Tuple[str, bytes]:
+    # Runs in a worker process, so it only deals in picklable values.
+    with Image.open(BytesIO(content)) as image:
+        oversized = max_resolution is not None and (
+            image.width > max_resolution[0] or image.height > max_resolution[1])
+
+        if not oversized and (not formats or content_type in formats):
+            return content_type, content
+
+        target_type = content_type if (not formats or content_type in formats) else formats[0]
+        if target_type not in _FORMATS:
+            target_type = 'image/png'
+
+        image.load()
+        if oversized:
+            image.thumbnail(max_resolution)
+
+        if target_type == 'image/jpeg' and image.mode not in ('RGB', 'L'):
+            # JPEG has no alpha channel; flatten onto white like a page would.
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            rgba = image.convert('RGBA')
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            image = background
+
+        output = BytesIO()
+        image.save(output, _FORMATS[target_type], quality=quality, optimize=True)
+
+    return target_type, output.getvalue()
+
+class ImageProcessor:
+
+    def __init__(self, options: ImageProcessingOptions, workers: Optional[int]=None) -> None:
+        if options.transcodes and Image is None:
+            raise RuntimeError('Image processing requires Pillow; install webnovelparser[images].')
+
+        self._options = options
+        self._cache_dir = options.cache_dir
+        self._workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def options(self) -> ImageProcessingOptions:
+        return self._options
+
+    def process(self, content_type: str, content: bytes) -> Tuple[str, bytes]:
+        if not self._options.transcodes:
+            return content_type, content
+
+        key = sha256(content + self._options.signature().encode('utf-8')).hexdigest()
+        if (cached := self.__load(key)) is not None:
+            return cached
+
+        try:
+            result = self._executor.submit(_transcode, content, content_type,
+                self._options.formats, self._options.max_resolution, self._options.quality).result()
+        except Exception as e:
+            # Anything Pillow can't read goes into the book untouched.
+            print(f'Failed to process image ({content_type}), keeping the original. Exception was: {e}')
+            return content_type, content
+
+        self.__store(key, result)
+        return result
+
+    def __load(self, key: str) -> Optional[Tuple[str, bytes]]:
+        if self._cache_dir is None:
+            return None
+
+        try:
+            with open(join(self._cache_dir, key), 'rb') as fobj:
+                content_type, content = fobj.read().split(b'\n', 1)
+        except (OSError, ValueError):
+            return None
+
+        return content_type.decode('ascii'), content
+
+    def __store(self, key: str, result: Tuple[str, bytes]) -> None:
+        if self._cache_dir is None:
+            return
+
+        content_type, content = result
+        with atomic_write(join(self._cache_dir, key)) as fobj:
+            fobj.write(content_type.encode('ascii') + b'\n')
+            fobj.write(content)
+
+    def __enter__(self):
+        if self._options.transcodes:
+            self._executor = ProcessPoolExecutor(self._workers)
+        return self
+
+    def __exit__(self, exception_type, exception_val, tb):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -0,0 +1,31 @@
+from re import compile
+from typing import Optional, Union
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml # Only needed as a BeautifulSoup tree builder.
+    DEFAULT_HTML_PARSER = 'lxml'
+except ImportError:
+    DEFAULT_HTML_PARSER = 'html.parser'
+
+
+# Only the chapter body is ever used from a chapter page; navigation, comments
+# and scripts around it are skipped by the tree builder instead of parsed. The
+# class is matched as a pattern since strainers see the unsplit attribute.
+CHAPTER_CONTENTS = SoupStrainer(attrs={ 'class': compile(r'(^|\s)chapter-inner(\s|$)') })
+
+# An update check only needs the story page's chapter table.
+CHAPTER_TABLE = SoupStrainer(id='chapters')
+
+_html_parser = DEFAULT_HTML_PARSER
+
+def set_html_parser(parser: Optional[str]) -> None:
+    global _html_parser
+    _html_parser = parser or DEFAULT_HTML_PARSER
+
+def get_html_parser() -> str:
+    return _html_parser
+
+def parse_html(markup: Union[str, bytes], parse_only: Optional[SoupStrainer]=None) -> BeautifulSoup:
+    return BeautifulSoup(markup, _html_parser, parse_only=parse_only)
@@ -0,0 +1,153 @@
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from threading import Lock
+from time import perf_counter
+from typing import ContextManager, Dict, Optional
+
+
+# Upper bounds of the histogram buckets in milliseconds; anything slower lands
+# in a final, open-ended bucket.
+_BUCKET_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class _Histogram:
+
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(_BUCKET_BOUNDS_MS) + 1)
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect_left(_BUCKET_BOUNDS_MS, seconds * 1000)] += 1
+
+    def percentile(self, fraction: float) -> float:
+        # Reported as the upper bound of the bucket the sample falls in, so
+        # it is never lower than the true value.
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(_BUCKET_BOUNDS_MS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max * 1000)
+        return self.max * 1000
+
+    def to_dict(self) -> dict:
+        labels = [ f'<={bound}ms' for bound in _BUCKET_BOUNDS_MS ] + [ f'>{_BUCKET_BOUNDS_MS[-1]}ms' ]
+        return {
+            'count': self.count,
+            'total_s': round(self.total, 6),
+            'mean_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            'p50_ms': round(self.percentile(.50), 3),
+            'p90_ms': round(self.percentile(.90), 3),
+            'p99_ms': round(self.percentile(.99), 3),
+            'max_ms': round(self.max * 1000, 3),
+            'histogram': { label: count for label, count in zip(labels, self.buckets) if count }
+        }
+
+class _LockStats:
+
+    __slots__ = ('acquisitions', 'contended', 'wait')
+
+    def __init__(self) -> None:
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait = _Histogram()
+
+    def to_dict(self) -> dict:
+        return { 'acquisitions': self.acquisitions, 'contended': self.contended, 'wait': self.wait.to_dict() }
+
+class Profiler:
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._started = perf_counter()
+        self._stages: Dict[str, _Histogram] = {}
+        self._counters: Dict[str, int] = {}
+        self._locks: Dict[str, _LockStats] = {}
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            if (histogram := self._stages.get(name)) is None:
+                histogram = self._stages[name] = _Histogram()
+            histogram.add(seconds)
+
+    def count(self, name: str, amount: int=1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    @contextmanager
+    def stage(self, name: str):
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, perf_counter() - started)
+
+    @contextmanager
+    def hold(self, lock, name: str):
+        # Only an acquisition that actually had to wait is timed.
+        waited = None
+        if not lock.acquire(blocking=False):
+            started = perf_counter()
+            lock.acquire()
+            waited = perf_counter() - started
+
+        try:
+            yield lock
+        finally:
+            lock.release()
+
+            with self._lock:
+                if (stats := self._locks.get(name)) is None:
+                    stats = self._locks[name] = _LockStats()
+                stats.acquisitions += 1
+                if waited is not None:
+                    stats.contended += 1
+                    stats.wait.add(waited)
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                'wall_s': round(perf_counter() - self._started, 6),
+                'stages': { name: self._stages[name].to_dict() for name in sorted(self._stages) },
+                'counters': dict(sorted(self._counters.items())),
+                'locks': { name: self._locks[name].to_dict() for name in sorted(self._locks) }
+            }
+
+# Profiling is off unless a Profiler is installed. The helpers below are what
+# the hot paths call; disabled, each is a global lookup and a shared no-op.
+_profiler: Optional[Profiler] = None
+_DISABLED = nullcontext()
+
+def enable_profiling() -> Profiler:
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+def get_profiler() -> Optional[Profiler]:
+    return _profiler
+
+def stage(name: str) -> ContextManager:
+    if _profiler is None:
+        return _DISABLED
+    return _profiler.stage(name)
+
+def record(name: str, seconds: float) -> None:
+    if _profiler is not None:
+        _profiler.record(name, seconds)
+
+def count(name: str, amount: int=1) -> None:
+    if _profiler is not None:
+        _profiler.count(name, amount)
+
+def locked(lock, name: str) -> ContextManager:
+    # A plain lock is its own context manager, so disabled this adds nothing
+    # to `with lock:`.
+    if _profiler is None:
+        return lock
+    return _profiler.hold(lock, name)
@@ -0,0 +1,175 @@
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from threading import Condition, Lock
+from time import monotonic
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from requests import ConnectionError, Response, Timeout
+
+from webnovelparser.epub.profiling import count, stage
+
+
+# Statuses worth another attempt; every other 4xx is the server's final answer.
+TRANSIENT_STATUSES = frozenset((408, 425, 429, 500, 502, 503, 504))
+THROTTLE_STATUSES = frozenset((429, 503))
+
+def is_transient_status(status_code: int) -> bool:
+    return status_code in TRANSIENT_STATUSES
+
+def is_transient_error(error: BaseException) -> bool:
+    if isinstance(error, TransientResponseError):
+        return True
+    return isinstance(error, (ConnectionError, Timeout))
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max((moment - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+class TransientResponseError(Exception):
+
+    def __init__(self, response: Response) -> None:
+        super().__init__(f'{response.status_code} {response.reason} for url: {response.url}')
+        self.response = response
+
+class RequestPermit:
+
+    def __init__(self) -> None:
+        self.response: Optional[Response] = None
+
+class _HostState:
+
+    def __init__(self, burst: float, concurrency: float) -> None:
+        self.condition = Condition()
+        self.tokens = burst
+        self.refilled_at = monotonic()
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self.blocked_until = 0.0
+
+class HostRateLimiter:
+
+    # Pause applied to a host that answers 429 without sending Retry-After.
+    __DEFAULT_BACKOFF = 5.0
+
+    def __init__(self, rate: float=20.0, burst: Optional[float]=None,
+        max_concurrency: int=10, min_concurrency: int=1, latency_target: float=2.0) -> None:
+
+        if rate <= 0:
+            raise ValueError(f'Request rate must be positive, got {rate}.')
+
+        self._rate = rate
+        self._burst = burst if burst is not None else max(rate, 1.0)
+        self._max_concurrency = max_concurrency
+        self._min_concurrency = min(min_concurrency, max_concurrency)
+        self._latency_target = latency_target
+
+        self._hosts: Dict[str, _HostState] = {}
+        self._hosts_lock = Lock()
+        self._throttled = 0
+
+    @property
+    def throttled(self) -> int:
+        return self._throttled
+
+    def concurrency(self, url: str) -> int:
+        return int(self.__host(url).concurrency)
+
+    @contextmanager
+    def acquire(self, url: str):
+        # The holder reports the response through the permit, which decides how
+        # the host's concurrency limit moves once the slot is released.
+        host = self.__host(url)
+        permit = RequestPermit()
+
+        with stage('http.slot_wait'):
+            self.__wait_for_slot(host)
+        started = monotonic()
+        try:
+            yield permit
+        except (ConnectionError, Timeout):
+            self.__release(host, None, monotonic() - started, failed=True)
+            raise
+        except BaseException:
+            self.__release(host, permit.response, monotonic() - started)
+            raise
+        else:
+            self.__release(host, permit.response, monotonic() - started)
+
+    def __wait_for_slot(self, host: _HostState) -> None:
+        with host.condition:
+            while True:
+                now = monotonic()
+                self.__refill(host, now)
+
+                delay = host.blocked_until - now
+                if delay <= 0 and host.tokens < 1:
+                    delay = (1 - host.tokens) / self._rate
+
+                if delay <= 0 and host.in_flight < int(host.concurrency):
+                    host.tokens -= 1
+                    host.in_flight += 1
+                    return
+
+                host.condition.wait(delay if delay > 0 else None)
+
+    def __release(self, host: _HostState, response: Optional[Response], latency: float, failed: bool=False) -> None:
+        with host.condition:
+            host.in_flight -= 1
+
+            if failed:
+                # Connection failures and timeouts count as congestion.
+                host.concurrency = max(self._min_concurrency, host.concurrency / 2)
+            elif response is not None and response.status_code in THROTTLE_STATUSES:
+                self.__throttle(host, response.status_code, parse_retry_after(response.headers.get('Retry-After')))
+            elif response is not None and latency < self._latency_target:
+                # Additive increase: roughly one extra slot per window of requests.
+                host.concurrency = min(self._max_concurrency,
+                    host.concurrency + 1 / max(host.concurrency, 1))
+
+            host.condition.notify_all()
+
+    def __throttle(self, host: _HostState, status_code: int, retry_after: Optional[float]) -> None:
+        # Caller holds host.condition. Every request to the host waits out the
+        # pause, rather than each worker backing off on its own.
+        host.concurrency = max(self._min_concurrency, host.concurrency / 2)
+
+        with self._hosts_lock:
+            self._throttled += 1
+        count('http.throttled')
+
+        if retry_after is None:
+            if status_code != 429:
+                # A bare 503 is an overloaded server rather than a request to
+                # back off; fewer slots is enough, and the failed request is
+                # already retried with its own backoff.
+                return
+            retry_after = HostRateLimiter.__DEFAULT_BACKOFF
+        host.blocked_until = max(host.blocked_until, monotonic() + retry_after)
+        host.tokens = min(host.tokens, 0)
+
+    def __refill(self, host: _HostState, now: float) -> None:
+        host.tokens = min(self._burst, host.tokens + (now - host.refilled_at) * self._rate)
+        host.refilled_at = now
+
+    def __host(self, url: str) -> _HostState:
+        netloc = urlsplit(url).netloc.lower()
+
+        with self._hosts_lock:
+            if netloc not in self._hosts:
+                self._hosts[netloc] = _HostState(self._burst, self._max_concurrency)
+            return self._hosts[netloc]
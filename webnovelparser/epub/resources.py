@@ -1,10 +1,17 @@
 
-from typing import List
-
-from bs4.element import Tag
+from concurrent.futures import Executor, Future
+from io import BytesIO
+from shutil import copyfileobj
+from threading import Lock
+from typing import IO, BinaryIO, Dict, List, Optional, Tuple, Union
+
+from bs4.element import NavigableString, Tag
+from html import escape
 from re import sub, compile
-from requests import get
 
+from webnovelparser.epub.imaging import ImageProcessor
+from webnovelparser.epub.profiling import locked, stage
+from webnovelparser.epub.session import WebSession
 from webnovelparser.epub.templates import XMLTemplates
 
 
@@ -21,9 +28,12 @@ def _fix_filename(title: str) -> str:
 
     return title
 
+# Image bodies are copied into the archive this much at a time.
+_CHUNK_SIZE = 64 * 1024
+
 class NovelImage:
     
-    def __init__(self, id, path, content_type, content):
+    def __init__(self, id, path, content_type, content: Union[bytes, IO[bytes]]):
         self._id = id
         self._path = path
         self._content_type = content_type
@@ -43,28 +53,169 @@ class NovelImage:
 
     @property
     def content(self) -> bytes:
-        return self._content
+        if isinstance(self._content, bytes):
+            return self._content
+
+        self._content.seek(0)
+        return self._content.read()
+
+    def write_to(self, fobj: BinaryIO) -> None:
+        if isinstance(self._content, bytes):
+            fobj.write(self._content)
+            return
+
+        self._content.seek(0)
+        copyfileobj(self._content, fobj, _CHUNK_SIZE)
+
+    def release(self) -> None:
+        # Called once the image is in the archive; only the id and path are
+        # still needed by chapters that share it.
+        if not isinstance(self._content, bytes):
+            self._content.close()
+        self._content = b''
+
+class ImageRegistry:
+
+    def __init__(self, processor: Optional[ImageProcessor]=None) -> None:
+        self._processor = processor
+        self._lock = Lock()
+        self._by_source: Dict[str, Future] = {}
+        self._by_digest: Dict[str, NovelImage] = {}
+
+    @property
+    def unique_images(self) -> int:
+        return len(self._by_digest)
+
+    @property
+    def text_only(self) -> bool:
+        return self._processor is not None and self._processor.options.text_only
+
+    @property
+    def transcodes(self) -> bool:
+        return self._processor is not None and self._processor.options.transcodes
+
+    def process(self, content_type: str, content: bytes) -> Tuple[str, bytes]:
+        if self._processor is None:
+            return content_type, content
+        return self._processor.process(content_type, content)
+
+    def fetch(self, src: str, session: WebSession) -> Optional[NovelImage]:
+        # Every source URL is downloaded once per build, even when several
+        # chapters ask for it at the same time; later callers wait on the first.
+        with locked(self._lock, 'images'):
+            future = self._by_source.get(src)
+            if future is not None:
+                owner = False
+            else:
+                owner = True
+                future = self._by_source[src] = Future()
+
+        if not owner:
+            with stage('image.shared_wait'):
+                return future.result()
+
+        image = None
+        try:
+            image = self.__download(src, session)
+        finally:
+            future.set_result(image)
+
+        return image
+
+    def __download(self, src: str, session: WebSession) -> Optional[NovelImage]:
+        try:
+            with stage('image.download'):
+                response, body = session.download(src)
+                response.raise_for_status()
+                content, digest = body
+                content_type = response.headers['content-type'].split(';')[0].strip()
+        except Exception:
+            return None
+
+        # Different URLs serving the same bytes still share a single entry.
+        with locked(self._lock, 'images'):
+            if (image := self._by_digest.get(digest)) is not None:
+                content.close()
+                return image
+
+        if self.transcodes:
+            with content, stage('image.process'):
+                content_type, content = self.process(content_type, content.read())
+
+        with locked(self._lock, 'images'):
+            if (image := self._by_digest.get(digest)) is None:
+                ext = content_type.split('/')[1]
+                image = NovelImage(f'image-{digest[:16]}',
+                    f'Images/{digest[:16]}.{ext}', content_type, content)
+                self._by_digest[digest] = image
+                return image
+
+        # Another download of the same bytes got registered first.
+        if not isinstance(content, bytes):
+            content.close()
+        return image
+
+class CompactChapter:
+
+    # What is left of a chapter once it has been serialized: a few fields and
+    # the XHTML bytes. Builds keep these around instead of parsed trees.
+    __slots__ = ('_index', '_source', '_title', '_path', '_xhtml', '_images')
+
+    def __init__(self, index: int, source: str, title: str, xhtml: bytes, images: List[NovelImage]) -> None:
+        self._index = index
+        self._source = source
+        self._title = title
+        self._path = f'Text/{index:04}_{_fix_filename(title)}.xhtml'
+        self._xhtml = xhtml
+        self._images = images
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+    @property
+    def source(self) -> str:
+        return self._source
+
+    @property
+    def title(self) -> str:
+        return self._title
+
+    @property
+    def xhtml(self) -> bytes:
+        return self._xhtml
+
+    @property
+    def images(self) -> List[NovelImage]:
+        return self._images
+
+    @property
+    def id(self) -> str:
+        return  f'xhtml{self.index:04}'
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def write_to(self, fobj: BinaryIO) -> None:
+        fobj.write(self._xhtml)
 
 class NovelChapter:
 
-    def __init__(self, index: int, source: str, title: str, chapter_contents: Tag) -> None:
+    # Bump whenever __fix_chapter_contents or the serialized form changes, so
+    # chapters kept in a ChapterStore are rebuilt instead of reused.
+    FIXER_VERSION = 2
 
-        contents = XMLTemplates.get_xhtml('chapter')
-        head = contents.find('html').find('head')
-        body = contents.find('html').find('body')
+    __wrapper: Optional[Tuple[str, str, str]] = None
 
-        title_tag = contents.new_tag('title')
-        title_tag.string = title
-        head.append(title_tag)
+    def __init__(self, index: int, source: str, title: str, chapter_contents: Tag, session: WebSession) -> None:
 
-        title_tag = contents.new_tag('h1')
-        title_tag.string = title
-        body.append(title_tag)
-        
-        NovelChapter.__fix_chapter_contents(chapter_contents)
-        body.append(chapter_contents)
+        with stage('chapter.fix'):
+            NovelChapter.__fix_chapter_contents(chapter_contents)
 
-        self._contents = contents
+        self._contents = chapter_contents
+        self._session = session
+        self._images: Optional[List[NovelImage]] = None
         self._index = index
         self._source = source
         self._title = title
@@ -93,32 +244,154 @@ class NovelChapter:
     def path(self) -> str:
         return f'Text/{self.index:04}_{_fix_filename(self.title)}.xhtml'
 
-    def extract_images(self) -> List[NovelImage]:
+    def image_sources(self) -> List[str]:
+        # Tags without a src (lazy-loaded ones only carry data-src) have
+        # nothing to fetch; attach_images() drops them.
+        return [ src for image_tag in self.contents.find_all('img') if (src := image_tag.get('src')) ]
+
+    def attach_images(self, fetched: Dict[str, Optional[NovelImage]]) -> List[NovelImage]:
 
-        images = []
+        images = {}
         
         for image_tag in self.contents.find_all('img'):
-            try:
-                response = get(image_tag['src'], stream=True)
-                response.raise_for_status()
-            except Exception:
+            src = image_tag.get('src')
+            image = fetched.get(src) if src else None
+
+            if image is None:
                 print(f'Failed to fetch image for chapter#{self.index}, removing...')
                 image_tag.decompose()
             else:
-                content_type = response.headers.get('content-type')
-                ext = content_type.split('/')[1]
+                image_tag['src'] = f'../{image.path}'
+                images[image.id] = image
+
+        self._images = list(images.values())
+        return self._images
+
+    def drop_images(self) -> List[NovelImage]:
+        for image_tag in self.contents.find_all('img'):
+            image_tag.decompose()
+
+        self._images = []
+        return self._images
+
+    def fetch_images(self, registry: ImageRegistry, executor: Optional[Executor]=None) -> List[NovelImage]:
+        if registry.text_only:
+            return self.drop_images()
+
+        sources = list(dict.fromkeys(self.image_sources()))
 
-                filename = f'Images/{len(images):04}_{_fix_filename(self.title)}.{ext}'
-                image_tag['src'] = f'../{filename}'
-                
-                image = NovelImage(f'{self.index}image{len(images)}',
-                    filename, content_type, response.content)
+        def fetch(src: str) -> Optional[NovelImage]:
+            # One bad image is dropped from the chapter, not the chapter itself.
+            try:
+                return registry.fetch(src, self._session)
+            except Exception:
+                return None
+
+        with stage('chapter.images'):
+            if executor is None:
+                fetched = dict(zip(sources, map(fetch, sources)))
+            else:
+                fetched = dict(zip(sources, executor.map(fetch, sources)))
+
+        return self.attach_images(fetched)
+
+    @property
+    def images(self) -> List[NovelImage]:
+        # Fetching rewrites the image tags, so it has to happen (off the
+        # writer's critical section) before the chapter can be written.
+        if self._images is None:
+            raise ValueError(f'Images for chapter#{self.index} have not been fetched.')
+        return self._images
+
+    def compact(self) -> CompactChapter:
+        # Once the images are rewritten nothing else changes the tree, so it is
+        # serialized here and the (much larger) parsed page can be dropped.
+        buffer = BytesIO()
+        with stage('chapter.serialize'):
+            self.write_to(buffer)
+        return CompactChapter(self._index, self._source, self._title, buffer.getvalue(), self.images)
+
+    def write_to(self, fobj: BinaryIO) -> None:
+        # The XHTML wrapper comes straight from the template text and the
+        # chapter body is rendered one paragraph at a time, so neither a full
+        # document tree nor the whole document string is ever built.
+        head, body, tail = NovelChapter.__chapter_wrapper()
+        title = escape(self._title, quote=False)
+
+        name = NovelChapter.__tag_name(self._contents)
+
+        fobj.write(f'{head}<title>{title}</title></head>{body}<h1>{title}</h1>'.encode('utf-8'))
+        fobj.write(NovelChapter.__opening_tag(self._contents, name).encode('utf-8'))
+
+        # Written out a top level block at a time; a chapter is mostly a flat
+        # run of paragraphs, so no chunk gets large.
+
+        for child in self._contents.contents:
+            out = []
+            NovelChapter.__serialize(child, out)
+            fobj.write(''.join(out).encode('utf-8'))
+
+        fobj.write(f'</{name}></body>{tail}'.encode('utf-8'))
+
+    @staticmethod
+    def __serialize(node, out: List[str]) -> None:
+        # Same output as Tag.decode() with the 'minimal' formatter, without
+        # its per-node formatter and event bookkeeping.
+        if isinstance(node, NavigableString):
+            if type(node) is NavigableString:
+                out.append(node.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;'))
+            else:
+                # Comments, CDATA, script and style text have their own rules.
+                out.append(node.output_ready('minimal'))
+            return
+
+        name = NovelChapter.__tag_name(node)
+
+        if node.is_empty_element:
+            out.append(NovelChapter.__opening_tag(node, name, '/>'))
+            return
+
+        out.append(NovelChapter.__opening_tag(node, name))
+        for child in node.contents:
+            NovelChapter.__serialize(child, out)
+        out.append(f'</{name}>')
+
+    @staticmethod
+    def __tag_name(node: Tag) -> str:
+        return f'{node.prefix}:{node.name}' if node.prefix else node.name
+
+    @staticmethod
+    def __opening_tag(node: Tag, name: str, end: str='>') -> str:
+        parts = [ f'<{name}' ]
+
+        # Attributes are sorted, as BeautifulSoup's formatters do.
+        for key, value in sorted(node.attrs.items()):
+            if value is None:
+                parts.append(f' {key}')
+                continue
+            if isinstance(value, (list, tuple)):
+                value = ' '.join(value)
+
+            value = str(value).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+            if '"' not in value:
+                parts.append(f' {key}="{value}"')
+            elif "'" not in value:
+                parts.append(f" {key}='{value}'")
+            else:
+                parts.append(f' {key}="{value.replace(chr(34), "&quot;")}"')
 
-                images.append(image)
+        parts.append(end)
+        return ''.join(parts)
 
-        return images
+    @staticmethod
+    def __chapter_wrapper() -> Tuple[str, str, str]:
+        if NovelChapter.__wrapper is None:
+            head, _, rest = XMLTemplates.get_text('chapter.xhtml').partition('<head></head>')
+            body, _, tail = rest.partition('<body></body>')
+            NovelChapter.__wrapper = (f'{head}<head>', f'{body}<body>', tail)
+        return NovelChapter.__wrapper
 
-    @staticmethod    
+    @staticmethod
     def __fix_chapter_contents(content: Tag) -> None:
 
         # First, pick a better width value for tables.
@@ -0,0 +1,185 @@
+from hashlib import sha256
+from tempfile import SpooledTemporaryFile
+from threading import Lock
+from typing import IO, List, Optional, Tuple, Union
+
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+from urllib3.connectionpool import HTTPConnectionPool
+from urllib3.poolmanager import PoolManager
+
+from webnovelparser.epub.cache import HttpCache, HttpCacheStats
+from webnovelparser.epub.defaults import DEFAULT_MAX_ATTEMPTS, DEFAULT_POOL_SIZE, DEFAULT_RATE, DEFAULT_TIMEOUT
+from webnovelparser.epub.profiling import count, record, stage
+from webnovelparser.epub.ratelimit import HostRateLimiter, TransientResponseError, is_transient_error, is_transient_status
+
+
+# Bodies up to this size stay in memory while they wait for the writer; larger
+# ones roll over to a temporary file.
+_SPOOL_LIMIT = 256 * 1024
+_CHUNK_SIZE = 64 * 1024
+
+def spool_response(response: Response) -> Tuple[IO[bytes], str]:
+    spool = SpooledTemporaryFile(max_size=_SPOOL_LIMIT)
+    digest = sha256()
+
+    for chunk in response.iter_content(_CHUNK_SIZE):
+        digest.update(chunk)
+        spool.write(chunk)
+
+    spool.seek(0)
+    return spool, digest.hexdigest()
+
+class WebSessionStats:
+
+    def __init__(self, connections_opened: int, requests_sent: int, retries: int, throttled: int,
+        cache: Optional[HttpCacheStats]) -> None:
+
+        self.connections_opened = connections_opened
+        self.connections_reused = max(requests_sent - connections_opened, 0)
+        self.requests_sent = requests_sent
+        self.retries = retries
+        self.throttled = throttled
+        self.cache = cache
+
+    def __str__(self) -> str:
+        text = (f'{self.requests_sent} requests, {self.connections_opened} connections opened, '
+            + f'{self.connections_reused} reused, {self.retries} retries, {self.throttled} throttled')
+
+        if self.cache is not None:
+            text += f'; cache: {self.cache}'
+
+        return text
+
+class _TrackingPoolManager(PoolManager):
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._pools_lock = Lock()
+        self._created_pools: List[HTTPConnectionPool] = []
+
+    def _new_pool(self, *args, **kwargs) -> HTTPConnectionPool:
+        # Pools can be dropped from the manager's LRU container, so keep our own
+        # references around for the connection counters.
+        pool = super()._new_pool(*args, **kwargs)
+        with self._pools_lock:
+            self._created_pools.append(pool)
+        return pool
+
+    def counters(self) -> Tuple[int, int]:
+        with self._pools_lock:
+            pools = self._created_pools[:]
+        return (sum(pool.num_connections for pool in pools),
+            sum(pool.num_requests for pool in pools))
+
+class _TrackingAdapter(HTTPAdapter):
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+
+        self.poolmanager = _TrackingPoolManager(num_pools=connections,
+            maxsize=maxsize, block=block, **pool_kwargs)
+
+class WebSession:
+
+    def __init__(self, pool_size: int=DEFAULT_POOL_SIZE,
+        timeout: Union[float, Tuple[float, float]]=DEFAULT_TIMEOUT,
+        cache: Optional[HttpCache]=None, rate: float=DEFAULT_RATE,
+        max_attempts: int=DEFAULT_MAX_ATTEMPTS, connections: Optional[int]=None) -> None:
+
+        self._timeout = timeout
+        self._cache = cache
+        self._max_attempts = max_attempts
+        self._limiter = HostRateLimiter(rate=rate, max_concurrency=pool_size)
+        self._retries = 0
+        self._retries_lock = Lock()
+        # pool_size caps requests in flight per host; connections is how many
+        # threads may share the session, so none of them ever has to open a
+        # connection that gets thrown away on return.
+        self._adapter = _TrackingAdapter(pool_maxsize=max(connections or pool_size, pool_size))
+
+        self._session = Session()
+        self._session.mount('http://', self._adapter)
+        self._session.mount('https://', self._adapter)
+
+    @property
+    def cache(self) -> Optional[HttpCache]:
+        return self._cache
+
+    @property
+    def limiter(self) -> HostRateLimiter:
+        return self._limiter
+
+    @property
+    def stats(self) -> WebSessionStats:
+        opened, sent = self._adapter.poolmanager.counters()
+        return WebSessionStats(opened, sent, self._retries, self._limiter.throttled,
+            self._cache.stats if self._cache else None)
+
+    def get(self, url: str, **kwargs) -> Response:
+        response, _ = self.__get(url, kwargs, spool=False)
+        return response
+
+    def download(self, url: str) -> Tuple[Response, Optional[Tuple[IO[bytes], str]]]:
+        # The body is spooled before the limiter permit is released, so large
+        # downloads count against the host's rate and concurrency like any
+        # other request. Unsuccessful responses come back without a body.
+        return self.__get(url, { 'stream': True }, spool=True)
+
+    def __get(self, url: str, kwargs: dict, spool: bool) -> Tuple[Response, Optional[Tuple[IO[bytes], str]]]:
+        kwargs.setdefault('timeout', self._timeout)
+
+        # Transient failures are retried, everything else (a 404, say) is handed
+        # straight back. Once attempts run out the last response is returned
+        # too, so callers keep using raise_for_status().
+        retrying = Retrying(
+            wait=wait_random_exponential(multiplier=.250, max=12),
+            stop=stop_after_attempt(self._max_attempts),
+            retry=retry_if_exception(is_transient_error),
+            before_sleep=self.__count_retry,
+            reraise=True
+        )
+
+        try:
+            for attempt in retrying:
+                with attempt:
+                    return self.__send(url, kwargs, spool)
+        except TransientResponseError as e:
+            return e.response, None
+
+    def get_cached(self, url: str, max_age: float=0) -> Response:
+        if self._cache is None:
+            return self.get(url)
+        return self._cache.fetch(url, self.get, max_age=max_age)
+
+    def __send(self, url: str, kwargs: dict, spool: bool) -> Tuple[Response, Optional[Tuple[IO[bytes], str]]]:
+        body = None
+        with self._limiter.acquire(url) as permit:
+            with stage('http.request'):
+                permit.response = self._session.get(url, **kwargs)
+                if spool and permit.response.ok:
+                    body = spool_response(permit.response)
+
+        if is_transient_status(permit.response.status_code):
+            permit.response.close() # Hand the connection back to the pool.
+            raise TransientResponseError(permit.response)
+        return permit.response, body
+
+    def __count_retry(self, retry_state) -> None:
+        with self._retries_lock:
+            self._retries += 1
+
+        count('http.retries')
+        record('http.backoff', retry_state.next_action.sleep)
+
+    def close(self) -> None:
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_val, tb):
+        self.close()
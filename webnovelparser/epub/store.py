@@ -0,0 +1,116 @@
+from os import makedirs
+from os.path import dirname
+from sqlite3 import Connection, connect
+from typing import Dict, Optional, Union
+from zlib import compress, decompress
+
+from webnovelparser.epub.resources import CompactChapter, NovelChapter, NovelImage
+
+
+class ChapterStore:
+
+    __SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS chapters (
+            story TEXT NOT NULL,
+            href TEXT NOT NULL,
+            version TEXT NOT NULL,
+            title TEXT NOT NULL,
+            source TEXT NOT NULL,
+            xhtml BLOB NOT NULL,
+            PRIMARY KEY (story, href, version)
+        );
+        CREATE TABLE IF NOT EXISTS images (
+            id TEXT NOT NULL,
+            version TEXT NOT NULL,
+            path TEXT NOT NULL,
+            content_type TEXT NOT NULL,
+            content BLOB NOT NULL,
+            PRIMARY KEY (id, version)
+        );
+        CREATE TABLE IF NOT EXISTS chapter_images (
+            story TEXT NOT NULL,
+            href TEXT NOT NULL,
+            version TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            image_id TEXT NOT NULL,
+            PRIMARY KEY (story, href, version, position)
+        );
+    '''
+
+    def __init__(self, path: str, variant: str='') -> None:
+        # The variant names whatever else shapes a finished chapter (image
+        # processing settings, say); chapters built differently never mix.
+        self._path = path
+        self._version = f'{NovelChapter.FIXER_VERSION}:{variant}'
+        self._connection: Optional[Connection] = None
+
+    @property
+    def version(self) -> str:
+        return self._version
+
+    def stored_titles(self, story: Union[int, str]) -> Dict[str, str]:
+        rows = self.__db().execute('SELECT href, title FROM chapters WHERE story = ? AND version = ?',
+            (str(story), self._version))
+        return dict(rows)
+
+    def load(self, story: Union[int, str], href: str, index: int, title: str) -> Optional[CompactChapter]:
+        row = self.__db().execute('SELECT title, source, xhtml FROM chapters '
+            + 'WHERE story = ? AND href = ? AND version = ?',
+            (str(story), href, self._version)).fetchone()
+
+        # A renamed chapter has to be rebuilt, its title is part of the XHTML.
+        if row is None or row[0] != title:
+            return None
+
+        images = [ NovelImage(id, path, content_type, bytes(content))
+            for id, path, content_type, content in self.__db().execute(
+                'SELECT images.id, images.path, images.content_type, images.content '
+                + 'FROM chapter_images JOIN images '
+                + 'ON images.id = chapter_images.image_id AND images.version = chapter_images.version '
+                + 'WHERE chapter_images.story = ? AND chapter_images.href = ? AND chapter_images.version = ? '
+                + 'ORDER BY chapter_images.position',
+                (str(story), href, self._version)) ]
+
+        return CompactChapter(index, row[1], title, decompress(row[2]), images)
+
+    def store(self, story: Union[int, str], href: str, chapter: CompactChapter) -> None:
+        story = str(story)
+        db = self.__db()
+
+        with db:
+            db.execute('INSERT OR REPLACE INTO chapters VALUES (?, ?, ?, ?, ?, ?)',
+                (story, href, self._version, chapter.title, chapter.source, compress(chapter.xhtml)))
+            db.execute('DELETE FROM chapter_images WHERE story = ? AND href = ? AND version = ?',
+                (story, href, self._version))
+
+            for position, image in enumerate(chapter.images):
+                if db.execute('SELECT 1 FROM images WHERE id = ? AND version = ?',
+                    (image.id, self._version)).fetchone() is None:
+
+                    db.execute('INSERT INTO images VALUES (?, ?, ?, ?, ?)',
+                        (image.id, self._version, image.path, image.content_type, image.content))
+
+                db.execute('INSERT INTO chapter_images VALUES (?, ?, ?, ?, ?)',
+                    (story, href, self._version, position, image.id))
+
+    def __db(self) -> Connection:
+        if self._connection is None:
+            if directory := dirname(self._path):
+                makedirs(directory, exist_ok=True)
+            # Builders running side by side (a batch fetch) write to the same file.
+            # Within a build the store is only used by one thread at a time, but
+            # the asyncio engine's writer thread isn't the one that opened it.
+            self._connection = connect(self._path, timeout=30, check_same_thread=False)
+            self._connection.executescript(ChapterStore.__SCHEMA)
+        return self._connection
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_val, tb):
+        self.close()
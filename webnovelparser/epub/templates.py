@@ -1,24 +1,57 @@
+from copy import copy
+from pkgutil import get_data
+from threading import Lock
+from typing import Dict, Tuple
 
 from bs4 import BeautifulSoup
-from pkg_resources import resource_string
 
 class XMLTemplates:
 
     __BASE_DIRECTORY = 'data/xml_templates'
 
+    # Templates are read and parsed once per process; callers get their own
+    # copy of the parsed tree, since they go on to modify it.
+    __lock = Lock()
+    __sources: Dict[str, str] = {}
+    __parsed: Dict[Tuple[str, str], BeautifulSoup] = {}
+
     @staticmethod
     def get_xml(filename: str) -> BeautifulSoup:
         
         if not filename.endswith(".xml"):
             filename += ".xml"
         
-        xmltext = resource_string("webnovelparser.epub", f'{XMLTemplates.__BASE_DIRECTORY}/{filename}')
-        return BeautifulSoup(xmltext, "xml")
+        return XMLTemplates.__copy(XMLTemplates.__parse(filename, "xml"))
 
     @staticmethod
     def get_xhtml(filename: str) -> BeautifulSoup:
         if not filename.endswith(".xhtml"):
             filename += ".xhtml"
         
-        xmltext = resource_string("webnovelparser.epub", f'{XMLTemplates.__BASE_DIRECTORY}/{filename}')
-        return BeautifulSoup(xmltext, "html.parser")
\ No newline at end of file
+        return XMLTemplates.__copy(XMLTemplates.__parse(filename, "html.parser"))
+
+    @staticmethod
+    def get_text(filename: str) -> str:
+        with XMLTemplates.__lock:
+            if (text := XMLTemplates.__sources.get(filename)) is None:
+                text = get_data("webnovelparser.epub", f'{XMLTemplates.__BASE_DIRECTORY}/{filename}').decode('utf-8')
+                XMLTemplates.__sources[filename] = text
+            return text
+
+    @staticmethod
+    def __parse(filename: str, parser: str) -> BeautifulSoup:
+        text = XMLTemplates.get_text(filename)
+
+        with XMLTemplates.__lock:
+            if (template := XMLTemplates.__parsed.get((filename, parser))) is None:
+                template = XMLTemplates.__parsed[(filename, parser)] = BeautifulSoup(text, parser)
+            return template
+
+    @staticmethod
+    def __copy(template: BeautifulSoup) -> BeautifulSoup:
+        # Copying the nodes is cheaper than copy(template), which re-parses the
+        # whole document. The shared template is only ever read here.
+        soup = BeautifulSoup('', template.builder.NAME if template.is_xml else 'html.parser')
+        for node in template.contents:
+            soup.append(copy(node))
+        return soup
@@ -1,9 +1,24 @@
 
-from requests import HTTPError, get
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from requests import Response
 from bs4 import BeautifulSoup
-from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 
-from webnovelparser.epub.resources import NovelMetadata, NovelChapter
+from webnovelparser.epub.cache import StoryPageCache, validators_for
+from webnovelparser.epub.parsing import CHAPTER_CONTENTS, CHAPTER_TABLE, parse_html
+from webnovelparser.epub.profiling import stage
+from webnovelparser.epub.resources import NovelChapter, NovelImage, NovelMetadata
+from webnovelparser.epub.session import WebSession
+
+
+class ChapterList(NamedTuple):
+    # Request headers that revalidate the page this list was parsed from.
+    validators: Dict[str, str]
+    chapters: List[Tuple[str, str]]
+
+    @property
+    def num_chapters(self) -> int:
+        return len(self.chapters)
 
 
 class _RoyalRoadStoryPage:
@@ -37,31 +52,97 @@ class _RoyalRoadStoryPage:
 
         return chapter_data
 
-    def __init__(self, source: str, html_text: str) -> None:
-        html_obj = BeautifulSoup(html_text, 'html.parser')
+    @staticmethod
+    def parse_chapter_data(html_text: str):
+        return _RoyalRoadStoryPage.__extract_chapter_data(parse_html(html_text, parse_only=CHAPTER_TABLE))
+
+    @staticmethod
+    def parse(source: str, html_text: str) -> '_RoyalRoadStoryPage':
+        # Parsed once per build, so the whole page is kept; it is the chapter
+        # pages that get the targeted treatment.
+        html_obj = parse_html(html_text)
 
-        author = _RoyalRoadStoryPage.__extract_author(html_obj)
-        title = _RoyalRoadStoryPage.__extract_title(html_obj)
-        self.chapter_data = _RoyalRoadStoryPage.__extract_chapter_data(html_obj)
+        return _RoyalRoadStoryPage(source,
+            _RoyalRoadStoryPage.__extract_title(html_obj),
+            _RoyalRoadStoryPage.__extract_author(html_obj),
+            _RoyalRoadStoryPage.__extract_chapter_data(html_obj),
+            _RoyalRoadStoryPage.__extract_cover_image_url(html_obj))
 
-        self.metadata = NovelMetadata(source, title, author, len(self.chapter_data))
+    @staticmethod
+    def from_record(record: dict) -> '_RoyalRoadStoryPage':
+        return _RoyalRoadStoryPage(record['source'], record['title'], record['author'],
+            [ tuple(chapter) for chapter in record['chapters'] ], record['cover'])
+
+    def to_record(self) -> dict:
+        return {
+            'source': self.metadata.source,
+            'title': self.metadata.title,
+            'author': self.metadata.author,
+            'chapters': self.chapter_data,
+            'cover': self._cover_image_url
+        }
+
+    def __init__(self, source: str, title: str, author: str, chapter_data: List[Tuple[str, str]],
+        cover_image_url: str) -> None:
+
+        self.chapter_data = chapter_data
+        self.metadata = NovelMetadata(source, title, author, len(chapter_data))
+        self._cover_image_url = cover_image_url
+
+    def fetch_cover_image(self, session: WebSession) -> Optional[NovelImage]:
+        response, body = session.download(self._cover_image_url)
+        if body is None:
+            return None
 
-        self._cover_image_url = _RoyalRoadStoryPage.__extract_cover_image_url(html_obj)
+        content_type = response.headers.get('content-type', '').split(';')[0].strip().lower()
+        if not content_type.startswith('image/'):
+            # Served as something generic (application/octet-stream, say);
+            # covers are JPEGs far more often than not.
+            content_type = 'image/jpeg'
+        content, _ = body
 
-    def fetch_cover_image(self) -> bytes: # TODO: Can this use NovelImage?
-        response = get(self._cover_image_url, stream=True)
-        if not response.ok:
+        if not content.read(1):
+            content.close()
             return None
-        return response.content
+        return NovelImage('cover-image', f'Images/Cover.{content_type.split("/")[1]}',
+            content_type, content)
+
+
+DEFAULT_BASE_URL = 'https://www.royalroad.com'
+
+# Overridable so the real request paths can be pointed at a stand-in server.
+_base_url = DEFAULT_BASE_URL
+
+def set_base_url(base_url: Optional[str]) -> None:
+    global _base_url
+    _base_url = (base_url or DEFAULT_BASE_URL).rstrip('/')
+
+def get_base_url() -> str:
+    return _base_url
 
 
 class RoyalRoadWebNovel:
-    __BASE_URL = 'https://www.royalroad.com'
 
-    def __init__(self, story_id, name_override=None) -> None:
-        self._story_page = RoyalRoadWebNovel.__fetch_story_page(story_id)
+    # Published chapters are rarely edited, so a cached copy is served without
+    # revalidation for this long. The story page is always revalidated.
+    __CHAPTER_MAX_AGE = 7 * 24 * 60 * 60
+
+    def __init__(self, story_id, name_override=None, session: Optional[WebSession]=None,
+        story_cache: Optional[StoryPageCache]=None) -> None:
+
+        self._story_id = story_id
+        self._session = session or WebSession()
+        self._story_page = RoyalRoadWebNovel.__fetch_story_page(story_id, self._session, story_cache)
         self._name_override = name_override
 
+    @property
+    def story_id(self):
+        return self._story_id
+
+    @property
+    def session(self) -> WebSession:
+        return self._session
+
     @property
     def metadata(self) -> NovelMetadata:
         if self._name_override not in ("", None):
@@ -72,12 +153,20 @@ class RoyalRoadWebNovel:
         self._name_override = new_name
 
     def get_chapter(self, index: int) -> NovelChapter:
+        return self.parse_chapter_page(index, self.fetch_chapter_page(index))
 
-        try:
-            title, href = self._story_page.chapter_data[index]
-            return RoyalRoadWebNovel.__fetch_chapter(index, title, href)
-        except IndexError:
-            raise ValueError(f"Web novel doesn't have a chapter number {index}.")
+    def fetch_chapter_page(self, index: int) -> Response:
+        with stage('chapter.fetch'):
+            return RoyalRoadWebNovel.__fetch_chapter_page(self.peek_chapter_href(index), self._session)
+
+    def parse_chapter_page(self, index: int, response: Response) -> NovelChapter:
+        title = self.peek_chapter_title(index)
+
+        with stage('chapter.parse'):
+            html_obj = parse_html(response.text, parse_only=CHAPTER_CONTENTS)
+            contents = html_obj.find(class_="chapter-inner")
+
+        return NovelChapter(index, response.url, title, contents, self._session)
 
     def peek_chapter_title(self, index) -> str:
 
@@ -87,27 +176,61 @@ class RoyalRoadWebNovel:
         except IndexError:
             raise ValueError(f"Web novel doesn't have a chapter number {index}.")
 
-    def get_cover_image(self):
-        return self._story_page.fetch_cover_image()
+    def peek_chapter_href(self, index) -> str:
+
+        try:
+            _, href = self._story_page.chapter_data[index]
+            return href
+        except IndexError:
+            raise ValueError(f"Web novel doesn't have a chapter number {index}.")
+
+    def get_cover_image(self) -> Optional[NovelImage]:
+        return self._story_page.fetch_cover_image(self._session)
 
     @staticmethod
-    def __fetch_story_page(story_id: int) -> _RoyalRoadStoryPage:
-        response = get(f'{RoyalRoadWebNovel.__BASE_URL}/fiction/{story_id}')
+    def fetch_chapter_list(story_id: int, session: WebSession, known: Optional[ChapterList]=None) -> ChapterList:
+        # A conditional request against the last list seen: an unchanged page
+        # costs a bodiless 304 and no parsing, a changed one only has its
+        # chapter table parsed.
+        response = session.get(f'{_base_url}/fiction/{story_id}',
+            headers=known.validators if known else {})
+
+        if response.status_code == 304 and known is not None:
+            return known
         response.raise_for_status()
-        return _RoyalRoadStoryPage(response.url, response.text)
+
+        return ChapterList(validators_for(response), _RoyalRoadStoryPage.parse_chapter_data(response.text))
 
     @staticmethod
-    @retry(
-            wait=wait_random_exponential(multiplier=.250, max=12),
-            stop=stop_after_attempt(15),
-            retry=retry_if_exception_type(HTTPError),
-            reraise=True
-    )
-    def __fetch_chapter(index: int, title: str, href: str) -> NovelChapter:
-        response = get(f'{RoyalRoadWebNovel.__BASE_URL}{href}')
+    def __fetch_story_page(story_id: int, session: WebSession,
+        story_cache: Optional[StoryPageCache]=None) -> _RoyalRoadStoryPage:
+
+        url = f'{_base_url}/fiction/{story_id}'
+
+        if story_cache is None:
+            response = session.get_cached(url)
+            response.raise_for_status()
+            return _RoyalRoadStoryPage.parse(response.url, response.text)
+
+        # A record within its TTL is used without touching the network; an
+        # older one is revalidated, and only re-parsed if the page changed.
+        record = story_cache.load(story_id)
+        if record is not None and story_cache.is_fresh(record):
+            return _RoyalRoadStoryPage.from_record(record)
+
+        response = session.get(url, headers=record['validators'] if record else {})
+        if response.status_code == 304 and record is not None:
+            story_cache.store(story_id, record)
+            return _RoyalRoadStoryPage.from_record(record)
         response.raise_for_status()
 
-        html_obj = BeautifulSoup(response.text, 'html.parser')
-        contents = html_obj.find(class_="chapter-inner")
-        
-        return NovelChapter(index, response.url, title, contents)
\ No newline at end of file
+        story_page = _RoyalRoadStoryPage.parse(response.url, response.text)
+        story_cache.store(story_id, { **story_page.to_record(), 'validators': validators_for(response) })
+        return story_page
+
+    @staticmethod
+    def __fetch_chapter_page(href: str, session: WebSession) -> Response:
+        response = session.get_cached(f'{_base_url}{href}',
+            max_age=RoyalRoadWebNovel.__CHAPTER_MAX_AGE)
+        response.raise_for_status()
+        return response
\ No newline at end of file
@@ -1,201 +1,336 @@
 
-from zipfile import ZipFile
+from html import escape
+from io import TextIOWrapper
+from os import environ
+from os.path import isfile
+from re import fullmatch
+from time import gmtime, localtime, strftime, time
+from typing import IO, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+from zipfile import ZipFile, ZipInfo
 
 from bs4 import BeautifulSoup
-from bs4.element import Tag
 
-from webnovelparser.epub.resources import NovelMetadata, NovelChapter
+from webnovelparser.epub.profiling import stage
+from webnovelparser.epub.resources import CompactChapter, NovelChapter, NovelImage, NovelMetadata
 from webnovelparser.epub.templates import XMLTemplates
 
 
-class _TableOfContents:
+def _text(value) -> str:
+    return escape(str(value), quote=False)
 
-    def __init__(self, metadata: NovelMetadata) -> None:
-        
-        self._repr: BeautifulSoup = XMLTemplates.get_xml('toc_ncx')
-        self._nav_list = []
+def _attrs(**attrs) -> str:
+    # Keyword names use '_' where the attribute has '-' or ':'.
+    return ''.join(f' {key.replace("__", ":").replace("_", "-")}="{escape(str(value))}"'
+        for key, value in attrs.items() if value is not None)
 
-        self.__set_metadata(metadata)
+class _NavEntry(NamedTuple):
+    index: int
+    title: str
+    src: str
 
-    def add_entry(self, entry_id: int, entry_name: str, entry_location: str) -> None:
-        nav_point = self._repr.new_tag('navPoint', attrs={
-            'id': f'body{entry_id:04}',
-            'playOrder': entry_id
-        })
+class _ManifestItem(NamedTuple):
+    href: str
+    id: str
+    media_type: str
+    properties: Optional[str]
 
-        nav_point.append(self._repr.new_tag('navLabel'))
-        nav_point.find('navLabel').append(self._repr.new_tag('text'))
-        nav_point.find('navLabel').find('text').string = entry_name
+class _TableOfContents:
 
-        nav_point.append(self._repr.new_tag('content', attrs={
-            'src': entry_location
-        }))
+    # Entries are plain records until the archive is closed; the documents are
+    # generated from them a line at a time, straight into their zip entries.
+    def __init__(self, metadata: NovelMetadata) -> None:
+        self._metadata = metadata
+        self._entries: Dict[int, _NavEntry] = {}
 
-        self._nav_list.append(nav_point)
-    
-    def finalize(self) -> None:
-        self._nav_list.sort(key=lambda nav_point: nav_point['playOrder'])
-        for nav_point in self._nav_list:
-            self._repr.find('navMap').append(nav_point)
+    def add_entry(self, entry_id: int, entry_name: str, entry_location: str) -> None:
+        self._entries[entry_id] = _NavEntry(entry_id, entry_name, entry_location)
 
-    def __set_metadata(self, metadata: NovelMetadata) -> None:
-        title_text = self._repr.new_tag('text')
-        title_text.string = metadata.title
-        self._repr.find('ncx').find('docTitle').append(title_text)
+    def __sorted_entries(self) -> List[_NavEntry]:
+        return [ self._entries[idx] for idx in sorted(self._entries) ]
 
-        unique_id = self._repr.new_tag('meta', attrs={ 'name': 'dtb:uid', 'content': metadata.source })
-        self._repr.find('head').append(unique_id)
+    def ncx_lines(self) -> Iterator[str]:
+        yield '<?xml version="1.0" encoding="utf-8"?>\n'
+        yield '<ncx version="2005-1" xml:lang="en" xmlns="http://www.daisy.org/z3986/2005/ncx/">\n'
+        yield (f'<head><meta{_attrs(content=self._metadata.source, name="dtb:uid")}/>'
+            + '<meta content="2" name="dtb:depth"/><meta content="0" name="dtb:totalPageCount"/>'
+            + '<meta content="0" name="dtb:maxPageNumber"/></head>')
+        yield f'<docTitle><text>{_text(self._metadata.title)}</text></docTitle><navMap>'
 
-        # Don't know what these are for, but they seem to be fine with these default values.
+        for play_order, entry in enumerate(self.__sorted_entries(), start=1):
+            yield (f'<navPoint id="body{entry.index:04}" playOrder="{play_order}">'
+                + f'<navLabel><text>{_text(entry.title)}</text></navLabel>'
+                + f'<content{_attrs(src=entry.src)}/></navPoint>')
 
-        depth = self._repr.new_tag('meta', attrs={ 'name': 'dtb:depth', 'content': '2' })
-        self._repr.find('head').append(depth)
+        yield '</navMap>\n</ncx>'
 
-        total_page_count = self._repr.new_tag('meta', attrs={ 'name': 'dtb:totalPageCount', 'content': '0' })
-        self._repr.find('head').append(total_page_count)
+    def nav_lines(self) -> Iterator[str]:
+        title = _text(self._metadata.title)
 
-        max_page_number = self._repr.new_tag('meta', attrs={ 'name': 'dtb:maxPageNumber', 'content': '0' })
-        self._repr.find('head').append(max_page_number)
+        yield '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+        yield '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">\n'
+        yield f'<head><title>{title}</title></head><body><nav epub:type="toc" id="toc"><h1>{title}</h1><ol>'
 
-    def __str__(self) -> str:
-        return str(self._repr)
+        for entry in self.__sorted_entries():
+            yield f'<li><a{_attrs(href=entry.src)}>{_text(entry.title)}</a></li>'
+
+        yield '</ol></nav></body>\n</html>'
 
 class _ContentOpf:
     
-    def __init__(self, metadata: NovelMetadata) -> None:
-        self._repr: BeautifulSoup = XMLTemplates.get_xml('content_opf')
-        self._manifest = {}
-        self._spine = {}
-
-        self.__set_metadata(metadata)
-
-    def add_manifest_item(self, idx, href: str, id: str, media_type: str, add_to_spine: bool=False) -> None:
-        self._manifest[idx] = self._repr.new_tag('item', attrs={
-            'href': href, 'id': id, 'media-type': media_type
-        })
-
+    def __init__(self, metadata: NovelMetadata, epub3: bool=False, modified: Optional[str]=None) -> None:
+        self._metadata = metadata
+        self._epub3 = epub3
+        self._modified = modified
+        self._metadata_items: List[str] = []
+        self._manifest: Dict[Union[int, str], _ManifestItem] = {}
+        self._spine: Set[Union[int, str]] = set()
+
+    def add_manifest_item(self, idx, href: str, id: str, media_type: str, add_to_spine: bool=False,
+        properties: Optional[str]=None) -> None:
+
+        self._manifest[idx] = _ManifestItem(href, id, media_type, properties)
         if add_to_spine:
-            self._spine[idx] = self._repr.new_tag('itemref', attrs={'idref':id})
+            self._spine.add(idx)
 
     def add_metadata_item(self, name: str, attrs) -> None:
-        self._repr.find('metadata').append(self._repr.new_tag(name, attrs=attrs))
-
-    def finalize(self) -> None:
-        def sort_and_add_entries(collection: dict, dest: Tag):
-            indexed_entries = []
-            for key, val in collection.items():
-                if not isinstance(key, int):
-                    # If it isn't indexed, the order doesn't
-                    #  matter. Add it straight away.
-                    dest.append(val)
-                    continue
-                indexed_entries.append((key, val))
-            
-            indexed_entries.sort(key=lambda entry: entry[0])
-            for key, val in indexed_entries:
-                dest.append(val)
-
-        manifest = self._repr.find('manifest')
-        spine = self._repr.find('spine')
-
-        sort_and_add_entries(self._manifest, manifest)
-        sort_and_add_entries(self._spine, spine)
-
-
-    def __set_metadata(self, metadata: NovelMetadata) -> None:
-        metadata_tag = self._repr.find('package').find('metadata')
-
-        title = self._repr.new_tag('dc:title')
-        title.string = metadata.title
-        metadata_tag.append(title)
-
-        author = self._repr.new_tag('dc:creator', attrs={
-            'opf:file-as': metadata.author,
-            'opf:role': 'aut'
-        })
-        author.string = metadata.author
-        metadata_tag.append(author)
-
-        language = self._repr.new_tag('dc:language')
-        language.string = 'en' # default everything to english, for now.
-        metadata_tag.append(language)
-
-        source = self._repr.new_tag('dc:identifier', attrs={
-            'id': 'BookId',
-            'opf:scheme': 'URI'
-        })
-        source.string = metadata.source
-        metadata_tag.append(source)
-
-    def __str__(self) -> str:
-        return str(self._repr)
+        attributes = ''.join(f' {key}="{escape(str(value))}"' for key, value in attrs.items())
+        self._metadata_items.append(f'<{name}{attributes}/>')
+
+    def lines(self) -> Iterator[str]:
+        metadata = self._metadata
+
+        yield '<?xml version="1.0" encoding="utf-8"?>\n'
+        yield (f'<package unique-identifier="BookId" version="{"3.0" if self._epub3 else "2.0"}" '
+            + 'xmlns="http://www.idpf.org/2007/opf">\n')
+        yield ('<metadata xmlns:dc="http://purl.org/dc/elements/1.1/" '
+            + 'xmlns:opf="http://www.idpf.org/2007/opf">')
+        yield f'<dc:title>{_text(metadata.title)}</dc:title>'
+
+        if self._epub3:
+            yield f'<dc:creator>{_text(metadata.author)}</dc:creator>'
+        else:
+            yield f'<dc:creator{_attrs(opf__file_as=metadata.author, opf__role="aut")}>{_text(metadata.author)}</dc:creator>'
+
+        yield '<dc:language>en</dc:language>' # default everything to english, for now.
+        yield (f'<dc:identifier{_attrs(id="BookId", opf__scheme=None if self._epub3 else "URI")}>'
+            + f'{_text(metadata.source)}</dc:identifier>')
+
+        if self._epub3:
+            yield f'<meta property="dcterms:modified">{self._modified}</meta>'
+        yield from self._metadata_items
+        yield '</metadata>\n<manifest>'
+
+        # Entries without a chapter index come first, in the order they were
+        # added; chapters and their spine entries follow in reading order.
+        for key in self.__ordered(self._manifest):
+            item = self._manifest[key]
+            yield (f'<item{_attrs(href=item.href, id=item.id, media_type=item.media_type)}'
+                + f'{_attrs(properties=item.properties) if self._epub3 else ""}/>')
+
+        yield '</manifest>\n<spine toc="ncx">'
+        for key in self.__ordered(self._manifest):
+            if key in self._spine:
+                yield f'<itemref{_attrs(idref=self._manifest[key].id)}/>'
+        yield '</spine>\n</package>'
+
+    @staticmethod
+    def __ordered(collection: dict) -> List[Union[int, str]]:
+        named = [ key for key in collection if not isinstance(key, int) ]
+        return named + sorted(key for key in collection if isinstance(key, int))
 
 class EpubFile:
     
-    def __init__(self, metadata: NovelMetadata, filename: str) -> None:
+    __INDEX_FILES = ('OEBPS/content.opf', 'OEBPS/toc.ncx', 'OEBPS/nav.xhtml')
+
+    def __init__(self, metadata: NovelMetadata, filename: str, append: bool=False, epub3: bool=False) -> None:
+
+        append = append and isfile(filename)
 
-        self._zipfile = ZipFile(filename, 'w')
+        self._zipfile = ZipFile(filename, 'a' if append else 'w')
+        self._date_time = EpubFile.__build_date_time()
+        self._written_images = set()
+        self._chapter_indices = set()
+        self._has_cover = False
 
+        self._epub3 = epub3
         self._toc = _TableOfContents(metadata)
-        self._content_opf = _ContentOpf(metadata)
+        self._content_opf = _ContentOpf(metadata, epub3, EpubFile.__build_modified())
         
         # Populate barebones template
         self._content_opf.add_manifest_item("toc", href="toc.ncx",
             id="ncx", media_type="application/x-dtbncx+xml")
+        if epub3:
+            self._content_opf.add_manifest_item("nav", href="nav.xhtml",
+                id="nav", media_type="application/xhtml+xml", properties="nav")
 
-        EpubFile.__add_common_files(self._zipfile)
+        if append:
+            self.__load_existing_entries()
+        else:
+            self.__add_common_files()
+
+    @property
+    def chapter_indices(self) -> Set[int]:
+        return self._chapter_indices
+
+    @property
+    def has_cover(self) -> bool:
+        return self._has_cover
 
     def __enter__(self):
         self._zipfile.__enter__()
         return self
     
     def __exit__(self, exception_type, exception_val, tb):
-        self._toc.finalize()
-        self._content_opf.finalize()
-
-        self._zipfile.writestr('OEBPS/content.opf', str(self._content_opf))
-        self._zipfile.writestr('OEBPS/toc.ncx', str(self._toc))
-        self._zipfile.__exit__(exception_type,exception_val, tb)
-
-
-    def add_chapter(self, chapter: NovelChapter) -> None:
-        # Order matters here, extracting the images changes chapter.contents.
-        for image in chapter.extract_images():
-            self._zipfile.writestr(f'OEBPS/{image.path}', image.content)
+        with stage('epub.index'):
+            self.__write_lines('OEBPS/content.opf', self._content_opf.lines())
+            self.__write_lines('OEBPS/toc.ncx', self._toc.ncx_lines())
+            if self._epub3:
+                self.__write_lines('OEBPS/nav.xhtml', self._toc.nav_lines())
+        with stage('epub.close'):
+            self._zipfile.__exit__(exception_type,exception_val, tb)
+
+
+    def add_chapter(self, chapter: Union[NovelChapter, CompactChapter]) -> None:
+        for image in chapter.images:
+            # Images are shared between chapters; only the first one writes it.
+            if image.id in self._written_images:
+                continue
+            self._written_images.add(image.id)
+
+            with stage('epub.write_image'):
+                self.__write_image(image)
             self._content_opf.add_manifest_item(image.id, href=image.path,
                 id=image.id, media_type=image.content_type)
         
-        self._zipfile.writestr(f'OEBPS/{chapter.path}', chapter.contents.prettify())
+        with stage('epub.write_chapter'), self.__open_entry(f'OEBPS/{chapter.path}') as fobj:
+            chapter.write_to(fobj)
+        self._chapter_indices.add(chapter.index)
         
         self._content_opf.add_manifest_item(chapter.index, href=chapter.path,
             id=chapter.id, media_type='application/xhtml+xml', add_to_spine=True)
         self._toc.add_entry(chapter.index, chapter.title, chapter.path)
 
-    def add_cover(self, img_content: bytes) -> None:
-        if not img_content:
+    def add_cover(self, image: Optional[NovelImage]) -> None:
+        if image is None:
             return
 
         cover = XMLTemplates.get_xhtml('chapter')
         cover.find('head').append(cover.new_tag('title'))
         cover.find('body').append(cover.new_tag('div'))
         cover.find('body').find('div').append(cover.new_tag('img', attrs={
-            'src': '../Images/Cover.jpg', 'alt': ''
+            'src': f'../{image.path}', 'alt': ''
         }))
         
-        self._zipfile.writestr('OEBPS/Images/Cover.jpg', img_content)
-        self._zipfile.writestr('OEBPS/Text/Cover.xhtml', str(cover))
+        self.__write_image(image)
+        self.__writestr('OEBPS/Text/Cover.xhtml', str(cover))
 
-        self._content_opf.add_metadata_item('meta', attrs={ 'content': 'cover-image', 'name': 'cover' })
+        self._content_opf.add_metadata_item('meta', attrs={ 'content': image.id, 'name': 'cover' })
+        self._has_cover = True
 
-        self._content_opf.add_manifest_item('cover-image', 'Images/Cover.jpg', 'cover-image', 'image/jpeg')
+        self._content_opf.add_manifest_item(image.id, image.path, image.id, image.content_type,
+            properties='cover-image')
         self._content_opf.add_manifest_item('cover', 'Text/Cover.xhtml', 'cover', 'application/xhtml+xml', add_to_spine=True)
 
 
 
-    @staticmethod
-    def __add_common_files(zipfile: ZipFile) -> None:
+    def __load_existing_entries(self) -> None:
+        # Chapters and images already in the archive stay where they are; only
+        # the index files are rebuilt from what they list.
+        try:
+            content_opf = BeautifulSoup(self._zipfile.read('OEBPS/content.opf'), 'xml')
+            toc = BeautifulSoup(self._zipfile.read('OEBPS/toc.ncx'), 'xml')
+        except KeyError:
+            raise ValueError(f'{self._zipfile.filename} is not an EPUB, can\'t append to it.')
+
+        spine = { itemref['idref'] for itemref in content_opf.find('spine').find_all('itemref') }
+
+        for item in content_opf.find('manifest').find_all('item'):
+            id, href, media_type = item['id'], item['href'], item['media-type']
+            if id in ('ncx', 'nav'):
+                continue
+
+            if match := fullmatch(r'xhtml(\d+)', id):
+                self._chapter_indices.add(int(match.group(1)))
+                key = int(match.group(1))
+            else:
+                key = id
+                if media_type.startswith('image/'):
+                    self._written_images.add(id)
+
+            self._content_opf.add_manifest_item(key, href=href, id=id,
+                media_type=media_type, add_to_spine=id in spine, properties=item.get('properties'))
+
+        if (cover := content_opf.find('meta', attrs={ 'name': 'cover' })) is not None:
+            self._content_opf.add_metadata_item('meta', attrs={ 'content': cover['content'], 'name': 'cover' })
+            self._has_cover = True
+
+        for nav_point in toc.find('navMap').find_all('navPoint'):
+            self._toc.add_entry(int(nav_point['id'][len('body'):]),
+                nav_point.find('text').get_text(), nav_point.find('content')['src'])
+
+        self.__drop_index_files()
+
+    def __drop_index_files(self) -> None:
+        # ZipFile can't delete entries, but the index files are always the last
+        # ones written, so new entries simply overwrite them and closing the
+        # archive truncates whatever is left.
+        index_files = [ name for name in EpubFile.__INDEX_FILES if name in self._zipfile.NameToInfo ]
+        entries = sorted(self._zipfile.infolist(), key=lambda zinfo: zinfo.header_offset)
+        trailing = entries[-len(index_files):]
+
+        if sorted(zinfo.filename for zinfo in trailing) != sorted(index_files):
+            raise ValueError(f'{self._zipfile.filename} was not written by webnovelparser, can\'t append to it.')
+
+        for zinfo in trailing:
+            self._zipfile.filelist.remove(zinfo)
+            del self._zipfile.NameToInfo[zinfo.filename]
+
+        self._zipfile.start_dir = trailing[0].header_offset
+        self._zipfile.fp.seek(self._zipfile.start_dir)
+
+    def __write_image(self, image: NovelImage) -> None:
+        # The body goes straight from its spool file into the archive, and the
+        # spool is dropped as soon as it has been written once.
+        with self.__open_entry(f'OEBPS/{image.path}') as fobj:
+            image.write_to(fobj)
+        image.release()
+
+    def __zip_info(self, name: str) -> ZipInfo:
+        # Every entry shares one timestamp, so the same chapters always produce
+        # the same archive no matter which builder engine wrote them.
+        zinfo = ZipInfo(name, date_time=self._date_time)
+        zinfo.external_attr = 0o600 << 16
+        return zinfo
+
+    def __writestr(self, name: str, data: Union[str, bytes]) -> None:
+        self._zipfile.writestr(self.__zip_info(name), data)
+
+    def __write_lines(self, name: str, lines: Iterator[str]) -> None:
+        with TextIOWrapper(self.__open_entry(name), encoding='utf-8', newline='') as fobj:
+            fobj.writelines(lines)
+
+    def __open_entry(self, name: str) -> IO[bytes]:
+        zinfo = self.__zip_info(name)
+        zinfo.compress_type = self._zipfile.compression
+        return self._zipfile.open(zinfo, 'w')
+
+    def __add_common_files(self) -> None:
         
-        zipfile.writestr("mimetype", "application/epub+zip")
+        self.__writestr("mimetype", "application/epub+zip")
 
         container_xml = XMLTemplates.get_xml('container')
-        zipfile.writestr("META-INF/container.xml", str(container_xml))
\ No newline at end of file
+        self.__writestr("META-INF/container.xml", str(container_xml))
+
+    @staticmethod
+    def __build_date_time() -> Tuple[int, int, int, int, int, int]:
+        # Honour SOURCE_DATE_EPOCH for reproducible builds.
+        if epoch := environ.get('SOURCE_DATE_EPOCH'):
+            return max(tuple(gmtime(int(epoch))[:6]), (1980, 1, 1, 0, 0, 0))
+        return tuple(localtime()[:6])
+
+    @staticmethod
+    def __build_modified() -> str:
+        # dcterms:modified is always UTC, unlike the zip entries' local
+        # date_time, which has no time zone at all.
+        epoch = environ.get('SOURCE_DATE_EPOCH')
+        return strftime('%Y-%m-%dT%H:%M:%SZ', gmtime(int(epoch) if epoch else time()))
\ No newline at end of file